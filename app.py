@@ -1,37 +1,154 @@
-from flask import Flask, render_template, request, redirect, send_file, session, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, send_file, session, url_for, flash, jsonify, g, stream_with_context, has_app_context
 import sqlite3
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from functools import wraps
 from werkzeug.security import check_password_hash, generate_password_hash
 import os
-import importlib
+import io
 import secrets
+import re
+from db_pool import get_pool, set_statement_hook
+import models
+import migrations
+import generate_chart
+import generate_qr
+import qr_sheets
+import bulk_io
+import rollups
+import forecast
+import route_planner
+import update_search
+from config import Config
+from lru import LRUCache
+from change_hub import hub
+from http_utils import encode_cursor, decode_cursor, conditional_json, compress_response
+from metrics import Metrics, N_PLUS_ONE_REPEATS, explain
+import json
+import threading
+import time
+from expiry import normalize_expiry_date
+from render_queue import RenderQueue
+from chart_cache import ChartCache
 
 app = Flask(__name__)
 # Generate a secure secret key
 app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
 
 DB = "database.db"
+pool = get_pool(DB)
+
+# Apply any pending schema migrations before serving requests
+migrations.migrate(DB)
+
+# Chart rendering runs off the request path; bursts of submissions coalesce
+render_queue = RenderQueue(debounce=2.0)
+# Rendered charts are cached on disk keyed by a hash of the data they show
+chart_cache = ChartCache("static/charts/cache", max_entries=50, max_bytes=20 * 1024 * 1024)
+CHART_LIMIT = 10
+CHART_RENDER = {"dpi": 150, "fmt": "png"}
+
+def popularity_chart_key(data):
+    return ChartCache.key_for(data, limit=CHART_LIMIT, **CHART_RENDER)
+
+def render_popularity_chart():
+    with pool.connection() as conn:
+        data = generate_chart.fetch_popularity(conn, CHART_LIMIT)
+    key = popularity_chart_key(data)
+    if chart_cache.get(key) is None:
+        chart_cache.put(key, generate_chart.draw_popularity(data, **CHART_RENDER))
+    else:
+        chart_cache.latest_key = key
+
+# Rendered QR codes (PNG/SVG bytes) keyed by payload hash + format
+qr_cache = LRUCache(max_entries=Config.QR_CACHE_ENTRIES)
+
+def schedule_chart_render():
+    render_queue.submit("popularity", render_popularity_chart)
+
+def cached_popularity_chart(data):
+    """
+    Key of the chart to show for `data`. If it isn't rendered yet a render
+    is queued and the most recent chart (if any) is returned meanwhile.
+    """
+    key = popularity_chart_key(data)
+    if chart_cache.get(key):
+        return key
+    schedule_chart_render()
+    latest = chart_cache.latest_key
+    return latest if latest and chart_cache.get(latest) else None
+
+def get_db():
+    """
+    Connection for the current app context, checked out of the pool once
+    and returned to it when the context is torn down.
+    """
+    if "db" not in g:
+        g.db = pool.checkout()
+    return g.db
+
+# ---------- METRICS ----------
+# Registered before compress() so response timings include compression
+metrics = Metrics(slow_query_seconds=Config.SLOW_QUERY_MS / 1000)
+
+@app.before_request
+def start_request_metrics():
+    endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+    g.request_stats = metrics.begin_request(endpoint, request.method)
+
+@app.after_request
+def record_request_metrics(response):
+    stats = g.pop("request_stats", None)
+    if stats is not None:
+        metrics.end_request(stats, response.status_code)
+    return response
+
+@app.after_request
+def compress(response):
+    return compress_response(request, response)
+
+@app.teardown_appcontext
+def close_db(exc):
+    conn = g.pop("db", None)
+    if conn is not None:
+        pool.checkin(conn)
+
+def profile_statement(conn, sql, args, seconds, rows, error):
+    """
+    Statement hook for db_pool: every statement on a pooled connection, from
+    query_db(), get_db() users or models helpers, is timed into the metrics
+    and slow ones are logged with their query plan.
+    """
+    stats = g.get("request_stats") if has_app_context() else None
+    normalized = metrics.observe_query(stats, sql, seconds, rows, error)
+    if seconds >= metrics.slow_query_seconds and not error:
+        plan = explain(conn, sql, args)
+        metrics.record_slow(stats, sql, seconds, rows, plan)
+        print(f"🐢 Slow query ({seconds * 1000:.1f} ms, {rows} row(s)) in {stats.endpoint if stats else '-'}: {normalized}")
+        for line in plan:
+            print(f"     {line}")
+
+set_statement_hook(profile_statement)
 
 def query_db(q, args=(), one=False):
     """
     Lightweight DB helper with better error handling.
     """
+    conn = None
     try:
-        conn = sqlite3.connect(DB)
-        cursor = conn.cursor()
-        cursor.execute(q, args)
+        conn = get_db()
+        cursor = conn.execute(q, args)
         is_select = q.strip().lower().startswith("select")
         data = cursor.fetchall()
         if not is_select:
             conn.commit()
-        conn.close()
-        if one:
-            return data[0] if data else None
-        return data
     except sqlite3.Error as e:
         print(f"Database error: {e}")
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
         return None if one else []
+    if one:
+        return data[0] if data else None
+    return data
 
 def login_required(role=None):
     """
@@ -159,22 +276,13 @@ def logout():
 @login_required(role="employee")
 def dashboard():
     snacks = query_db("SELECT id, name, stock, expiry_date FROM snacks ORDER BY name")
-    shelf_life_snacks = query_db("""
-        SELECT id, name, stock, expiry_date,
-        (julianday(expiry_date) - julianday('now')) AS days_left
-        FROM snacks
-        WHERE (julianday(expiry_date) - julianday('now')) <= 3
-        ORDER BY days_left ASC
-    """)
-    
-    # Get total stock count
-    total_stock = query_db("SELECT SUM(stock) FROM snacks", one=True)
-    total_snacks = total_stock[0] if total_stock and total_stock[0] else 0
+    shelf_life_snacks = models.get_expiring_snacks(days=3)
+    stats = models.get_inventory_stats()
     
     return render_template("dashboard.html", 
                          snacks=snacks, 
                          shelf_life_snacks=shelf_life_snacks,
-                         total_snacks=total_snacks)
+                         total_snacks=stats["total_stock"])
 
 # ---------- ADMIN PANEL ----------
 @app.route("/admin")
@@ -185,23 +293,15 @@ def admin_page():
     users = query_db("SELECT id, username, role FROM users ORDER BY role, username")
     
     # Statistics
-    total_machines = len(machines)
-    total_snacks = query_db("SELECT SUM(stock) FROM snacks", one=True)
-    total_stock = total_snacks[0] if total_snacks and total_snacks[0] else 0
-    
-    expiring_count = query_db("""
-        SELECT COUNT(*) FROM snacks
-        WHERE (julianday(expiry_date) - julianday('now')) <= 3
-    """, one=True)
-    expiring = expiring_count[0] if expiring_count else 0
+    stats = models.get_inventory_stats(expiring_days=3)
     
     return render_template("admin.html", 
                          machines=machines, 
                          snacks=snacks,
                          users=users,
-                         total_machines=total_machines,
-                         total_stock=total_stock,
-                         expiring=expiring)
+                         total_machines=len(machines),
+                         total_stock=stats["total_stock"],
+                         expiring=stats["expiring"])
 
 # ---------- ADD SNACK ----------
 @app.route("/add_snack", methods=["POST"])
@@ -215,6 +315,11 @@ def add_snack():
         flash("All fields are required!", "danger")
         return redirect(url_for("admin_page"))
 
+    expiry_date = normalize_expiry_date(expiry)
+    if not expiry_date:
+        flash("Expiry must be a valid date (YYYY-MM-DD)!", "danger")
+        return redirect(url_for("admin_page"))
+
     try:
         stock_int = int(stock)
         if stock_int < 0:
@@ -225,7 +330,8 @@ def add_snack():
         return redirect(url_for("admin_page"))
 
     query_db("INSERT INTO snacks (name, expiry_date, stock) VALUES (?, ?, ?)",
-             (name, expiry, stock_int))
+             (name, expiry_date, stock_int))
+    hub.publish("snacks", ())
     flash(f"Snack '{name}' added successfully!", "success")
     return redirect(url_for("admin_page"))
 
@@ -245,6 +351,7 @@ def update_snack(snack_id):
         return redirect(url_for("admin_page"))
     
     query_db("UPDATE snacks SET stock=? WHERE id=?", (stock_int, snack_id))
+    hub.publish("snacks", (snack_id,))
     flash("Stock updated successfully!", "success")
     return redirect(url_for("admin_page"))
 
@@ -255,6 +362,8 @@ def delete_snack(snack_id):
     snack = query_db("SELECT name FROM snacks WHERE id=?", (snack_id,), one=True)
     if snack:
         query_db("DELETE FROM snacks WHERE id=?", (snack_id,))
+        query_db("DELETE FROM machine_inventory WHERE snack_id=?", (snack_id,))
+        hub.publish("snacks", (snack_id,))
         flash(f"Snack '{snack[0]}' deleted successfully!", "success")
     else:
         flash("Snack not found!", "danger")
@@ -266,18 +375,37 @@ def delete_snack(snack_id):
 def add_machine():
     name = request.form.get("name", "").strip()
     location = request.form.get("location", "").strip()
+    coordinates = request.form.get("coordinates", "").strip()
     
     if not name or not location:
         flash("Machine name and location are required!", "danger")
         return redirect(url_for("admin_page"))
+
+    lat = lng = None
+    if coordinates:
+        try:
+            lat, lng = route_planner.parse_point(coordinates)
+        except ValueError:
+            flash("Coordinates must be 'latitude,longitude', e.g. 28.6139,77.2090", "danger")
+            return redirect(url_for("admin_page"))
     
-    query_db("INSERT INTO machines (name, location) VALUES (?, ?)", (name, location))
+    conn = get_db()
+    machine_id = conn.execute(
+        "INSERT INTO machines (name, location, latitude, longitude) VALUES (?, ?, ?, ?)",
+        (name, location, lat, lng)
+    ).lastrowid
+    # An empty slot per catalog snack, so the new machine shows up as out
+    # of stock in its page, the restock forecast and the route planner
+    conn.execute("""
+        INSERT OR IGNORE INTO machine_inventory (machine_id, snack_id, qty, updated_at)
+        SELECT ?, id, 0, ? FROM snacks
+    """, (machine_id, datetime.now().isoformat(timespec="seconds")))
+    conn.commit()
     flash(f"Machine '{name}' added successfully!", "success")
     
-    # Regenerate QR codes
+    # Generate the new machine's QR code
     try:
-        import generate_qr
-        importlib.reload(generate_qr)
+        generate_qr.generate_machine_qr(machine_id)
         flash("QR code generated for the new machine!", "info")
     except Exception as e:
         print(f"QR generation failed: {e}")
@@ -292,6 +420,8 @@ def delete_machine(machine_id):
     machine = query_db("SELECT name FROM machines WHERE id=?", (machine_id,), one=True)
     if machine:
         query_db("DELETE FROM machines WHERE id=?", (machine_id,))
+        query_db("DELETE FROM qr_codes WHERE machine_id=?", (machine_id,))
+        query_db("DELETE FROM machine_inventory WHERE machine_id=?", (machine_id,))
         # Delete QR code file
         qr_path = f"static/qrcodes/machine_{machine_id}.png"
         if os.path.exists(qr_path):
@@ -301,17 +431,60 @@ def delete_machine(machine_id):
         flash("Machine not found!", "danger")
     return redirect(url_for("admin_page"))
 
+# ---------- BULK IMPORT / EXPORT ----------
+BULK_TABLES = "any(snacks, machines, updates)"
+
+@app.route(f"/admin/import/<{BULK_TABLES}:table>", methods=["POST"])
+@login_required(role="admin")
+def bulk_import(table):
+    upload = request.files.get("file")
+    if not upload or not upload.filename:
+        flash("Please choose a CSV or NDJSON file to import!", "danger")
+        return redirect(url_for("admin_page"))
+
+    fmt = request.form.get("format") or bulk_io.format_for(upload.filename)
+    if fmt not in bulk_io.FORMATS:
+        flash(f"Unsupported import format '{fmt}'", "danger")
+        return redirect(url_for("admin_page"))
+
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+    try:
+        result = bulk_io.import_stream(get_db(), table, stream, fmt)
+    except UnicodeDecodeError:
+        flash("Import file must be UTF-8 text!", "danger")
+        return redirect(url_for("admin_page"))
+
+    if table == "snacks":
+        hub.publish("snacks")
+    elif table == "updates":
+        schedule_chart_render()
+
+    flash(f"Imported {result['imported']} {table} row(s).", "success")
+    if result["failed"]:
+        shown = "; ".join(f"row {e['row']}: {e['error']}" for e in result["errors"][:5])
+        flash(f"{result['failed']} row(s) rejected. {shown}", "warning")
+    return redirect(url_for("admin_page"))
+
+@app.route(f"/admin/export/<{BULK_TABLES}:table>.<any(csv, ndjson):fmt>")
+@login_required(role="admin")
+def bulk_export(table, fmt):
+    """Whole table as CSV or NDJSON, streamed in fetchmany() batches"""
+    def generate():
+        with pool.connection() as conn:
+            yield from bulk_io.iter_export(conn, table, fmt)
+
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={table}.{fmt}"},
+    )
+
 # ---------- SHELF LIFE PAGE ----------
 @app.route("/shelf_life")
 @login_required()
 def shelf_life():
-    snacks = query_db("""
-        SELECT id, name, stock, expiry_date,
-        (julianday(expiry_date) - julianday('now')) AS days_left
-        FROM snacks
-        WHERE (julianday(expiry_date) - julianday('now')) <= 3
-        ORDER BY days_left ASC
-    """)
+    snacks = models.get_expiring_snacks(days=3)
     return render_template("shelf_life.html", snacks=snacks)
 
 # ---------- MACHINES ----------
@@ -334,12 +507,165 @@ def machine(id):
 @login_required()
 def machine_view(id):
     machine = query_db("SELECT * FROM machines WHERE id=?", (id,), one=True)
-    snacks = query_db("SELECT id, name, stock, expiry_date FROM snacks ORDER BY name")
     if not machine:
         flash("Machine not found!", "danger")
         return redirect(url_for("machines"))
+    snacks = models.get_machine_inventory(id)
     return render_template("machine_view.html", machine=machine, snacks=snacks)
 
+STREAM_HEARTBEAT = 15      # seconds between keepalives
+STREAM_RESYNC = 60         # full re-read, for writes made by other worker processes
+STREAM_MAX_SECONDS = 300   # recycle long-lived streams; EventSource reconnects
+STREAM_BUSY_RETRY = 30000  # ms a viewer turned away at the stream cap waits to retry
+
+# Each open stream holds one of the worker's threads
+stream_slots = threading.BoundedSemaphore(Config.SSE_MAX_STREAMS)
+
+def machine_stock_snapshot(machine_id, snack_ids=None):
+    return {
+        row[0]: {"id": row[0], "name": row[1], "stock": row[2], "expiry_date": row[3]}
+        for row in models.get_machine_inventory(machine_id, snack_ids)
+    }
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/machine_view/<int:id>/stream")
+@login_required()
+def machine_view_stream(id):
+    """
+    Server-Sent Events feed of stock for machine_view. Sends a snapshot on
+    connect, then only the rows that changed: a publish on snacks or this
+    machine names the snack ids it touched and just those slots are re-read.
+    At most SSE_MAX_STREAMS stay open per worker; past that a viewer gets
+    one snapshot and a long retry, so it polls instead of holding a thread.
+    """
+    channels = ("snacks", f"machine:{id}")
+
+    def events():
+        if not stream_slots.acquire(blocking=False):
+            yield f"retry: {STREAM_BUSY_RETRY}\n"
+            yield sse_event("snapshot", list(machine_stock_snapshot(id).values()))
+            return
+        try:
+            yield from stream(hub.versions(channels))
+        finally:
+            stream_slots.release()
+
+    def stream(versions):
+        sent = machine_stock_snapshot(id)
+        yield f"retry: 3000\n"
+        yield sse_event("snapshot", list(sent.values()))
+
+        now = time.monotonic()
+        deadline, resync_at = now + STREAM_MAX_SECONDS, now + STREAM_RESYNC
+        while time.monotonic() < deadline:
+            versions, keys = hub.wait(versions, timeout=STREAM_HEARTBEAT)
+            if keys is None or time.monotonic() >= resync_at:
+                # Unknown scope, or time to catch writes this hub never heard about
+                keys, current = set(sent), machine_stock_snapshot(id)
+                keys.update(current)
+                resync_at = time.monotonic() + STREAM_RESYNC
+            elif keys:
+                current = machine_stock_snapshot(id, keys)
+            else:
+                yield ": keepalive\n\n"
+                continue
+            changed = [row for snack_id, row in current.items() if sent.get(snack_id) != row]
+            removed = [snack_id for snack_id in keys if snack_id in sent and snack_id not in current]
+            for row in changed:
+                sent[row["id"]] = row
+            for snack_id in removed:
+                del sent[snack_id]
+            if changed or removed:
+                yield sse_event("stock", {"changed": changed, "removed": removed})
+            else:
+                yield ": keepalive\n\n"
+
+    return app.response_class(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+RESTOCK_MAX_ITEMS = 5000
+
+@app.route("/api/machines/<int:id>/restock", methods=["POST"])
+@login_required(role="vendor")
+def api_restock_machine(id):
+    """
+    Bulk slot update for one machine, applied in a single transaction.
+    Body: {"mode": "set" | "add", "items": [{"snack_id": 1, "qty": 20}, ...]}
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("items"), list):
+        return api_error("Expected a JSON object with an 'items' list")
+
+    mode = body.get("mode", "set")
+    items = body["items"]
+    if not 1 <= len(items) <= RESTOCK_MAX_ITEMS:
+        return api_error(f"items must hold between 1 and {RESTOCK_MAX_ITEMS} entries")
+
+    slots = []
+    for i, item in enumerate(items):
+        snack_id = item.get("snack_id") if isinstance(item, dict) else None
+        qty = item.get("qty") if isinstance(item, dict) else None
+        if type(snack_id) is not int or type(qty) is not int:
+            return api_error(f"items[{i}] needs integer snack_id and qty")
+        if qty < 0 and mode == "set":
+            return api_error(f"items[{i}] qty cannot be negative")
+        slots.append((snack_id, qty))
+
+    if not query_db("SELECT 1 FROM machines WHERE id=?", (id,), one=True):
+        return api_error("Machine not found", 404)
+
+    try:
+        updated = models.restock_machine(id, slots, mode=mode)
+    except ValueError as e:
+        return api_error(str(e))
+
+    hub.publish(f"machine:{id}", (snack_id for snack_id, _ in slots))
+    return jsonify({"machine_id": id, "updated": updated})
+
+RESTOCK_LIST_SIZE = 15
+
+@app.route("/api/restock_recommendations")
+@login_required()
+def api_restock_recommendations():
+    """Machine slots ranked by forecast days until empty"""
+    limit = request.args.get("limit", RESTOCK_LIST_SIZE, type=int)
+    machine_id = request.args.get("machine_id", type=int)
+    if limit is None or not 1 <= limit <= API_MAX_PAGE_SIZE:
+        return api_error(f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+    return conditional_json(app, request, {
+        "items": forecast.restock_list(get_db(), limit=limit, machine_id=machine_id)
+    })
+
+def route_start():
+    """Configured route starting point, or None if unset or malformed."""
+    try:
+        return route_planner.parse_point(Config.ROUTE_START) if Config.ROUTE_START else None
+    except ValueError:
+        return None
+
+@app.route("/api/restock_route")
+@login_required()
+def api_restock_route():
+    """
+    The `limit` most urgent machines with low or expiring stock, in visiting
+    order. ?start=lat,lng overrides the configured starting point. The
+    vendor page loads this after rendering.
+    """
+    limit = request.args.get("limit", route_planner.ROUTE_MAX_STOPS, type=int)
+    if limit is None or not 1 <= limit <= API_MAX_PAGE_SIZE:
+        return api_error(f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+    try:
+        start = route_planner.parse_point(request.args["start"]) if request.args.get("start") else route_start()
+    except ValueError as e:
+        return api_error(str(e))
+    stops = route_planner.stops_needing_restock(get_db(), limit=limit)
+    return jsonify(route_planner.cached_route(stops, start))
+
 # ---------- VENDOR UPDATE ----------
 @app.route("/vendor_update", methods=["GET", "POST"])
 @login_required(role="vendor")
@@ -354,18 +680,14 @@ def vendor_update():
             flash("Please select a machine and provide update information!", "danger")
             return redirect(url_for("vendor_update"))
 
-        query_db(
-            "INSERT INTO updates (vendor, machine, info, time) VALUES (?, ?, ?, ?)",
-            (vendor, machine, info, time_str)
-        )
+        update_id = models.record_update(vendor, machine, info, time_str)
+        machine_row = query_db("SELECT machine_id FROM updates WHERE id=?", (update_id,), one=True)
+        if machine_row and machine_row[0]:
+            items = query_db("SELECT snack_id FROM update_items WHERE update_id=?", (update_id,))
+            hub.publish(f"machine:{machine_row[0]}", (row[0] for row in items))
         
         flash("Update submitted successfully!", "success")
-
-        try:
-            import generate_chart
-            importlib.reload(generate_chart)
-        except Exception as e:
-            print("Chart regeneration failed:", e)
+        schedule_chart_render()
 
         return redirect(url_for("vendor_update"))
 
@@ -377,22 +699,130 @@ def vendor_update():
         ORDER BY time DESC 
         LIMIT 10
     """, (session.get("username"),))
+
+    # Slots closest to running out, from cached consumption rates
+    restock = forecast.restock_list(get_db(), limit=RESTOCK_LIST_SIZE)
     
     return render_template("vendor_update.html", 
                          machines=machines, 
-                         recent_updates=recent_updates)
+                         recent_updates=recent_updates,
+                         restock=restock)
 
 # ---------- VIEW UPDATES ----------
+UPDATES_PAGE_SIZE = 50
+UPDATES_MAX_PAGE_SIZE = 500
+UPDATES_SEARCH_LIMIT = 50
+
+def update_page_key(cursor):
+    """(time, id) from a view_updates cursor; ValueError unless it is exactly that."""
+    decoded = decode_cursor(cursor)
+    key = decoded.get("key") if isinstance(decoded, dict) else None
+    if not (isinstance(key, list) and len(key) == 2
+            and isinstance(key[0], str) and type(key[1]) is int):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
 @app.route("/view_updates")
 @login_required(role="admin")
 def view_updates():
-    updates = query_db("""
-        SELECT id, vendor, machine, info, time 
-        FROM updates 
-        ORDER BY time DESC 
-        LIMIT 50
-    """)
-    return render_template("view_updates.html", updates=updates)
+    """
+    Update history, newest first, keyset-paginated on (time, id).
+    Filters: vendor, machine, type and a from/to date range. `before` /
+    `after` cursors step to older / newer pages. With `q`, shows the best
+    full-text matches instead.
+    """
+    q = request.args.get("q", "").strip()
+    if q:
+        try:
+            results = update_search.search(get_db(), q, UPDATES_SEARCH_LIMIT)
+        except ValueError as e:
+            flash(str(e), "warning")
+            return redirect(url_for("view_updates"))
+        return render_template("view_updates.html", q=q, results=results)
+
+    filters = {
+        "vendor": request.args.get("vendor", "").strip(),
+        "machine": request.args.get("machine", "").strip(),
+        "type": request.args.get("type", "").strip(),
+        "start": request.args.get("start", "").strip(),
+        "end": request.args.get("end", "").strip(),
+    }
+    limit = request.args.get("limit", UPDATES_PAGE_SIZE, type=int)
+    if limit is None or not 1 <= limit <= UPDATES_MAX_PAGE_SIZE:
+        limit = UPDATES_PAGE_SIZE
+
+    machines = query_db("SELECT id, name FROM machines ORDER BY name")
+    vendors = [row[0] for row in query_db(
+        "SELECT value FROM update_counts WHERE dimension = 'vendor' ORDER BY value"
+    )]
+
+    machine_id = None
+    if filters["machine"]:
+        machine_id = next((m[0] for m in machines if m[1] == filters["machine"]), -1)
+    if filters["type"] and filters["type"] not in models.UPDATE_TYPES:
+        flash(f"Unknown update type '{filters['type']}'", "danger")
+        filters["type"] = ""
+    try:
+        start = date.fromisoformat(filters["start"]) if filters["start"] else None
+        end = date.fromisoformat(filters["end"]) if filters["end"] else None
+    except ValueError:
+        flash("Dates must be YYYY-MM-DD", "danger")
+        start = end = None
+        filters["start"] = filters["end"] = ""
+
+    before = after = None
+    try:
+        if request.args.get("before"):
+            before = update_page_key(request.args["before"])
+        elif request.args.get("after"):
+            after = update_page_key(request.args["after"])
+    except ValueError:
+        flash("Invalid page link; showing the latest updates", "warning")
+
+    updates, older, newer = models.get_updates_page(
+        limit=limit,
+        before=before,
+        after=after,
+        vendor=filters["vendor"] or None,
+        machine_id=machine_id,
+        update_type=filters["type"] or None,
+        start=start,
+        end=end,
+    )
+
+    params = {k: v for k, v in filters.items() if v}
+    if limit != UPDATES_PAGE_SIZE:
+        params["limit"] = limit
+    older_url = url_for("view_updates", before=encode_cursor({"key": list(older)}), **params) if older else None
+    newer_url = url_for("view_updates", after=encode_cursor({"key": list(newer)}), **params) if newer else None
+
+    return render_template("view_updates.html", updates=updates, filters=filters,
+                           machines=machines, vendors=vendors, update_types=models.UPDATE_TYPES,
+                           older_url=older_url, newer_url=newer_url,
+                           latest_url=url_for("view_updates", **params) if before or after else None)
+
+@app.route("/api/updates/search")
+@login_required(role="admin")
+def api_search_updates():
+    """
+    Full-text search over update notes, best match first.
+    Query params: q (words, "a phrase"; the last word also matches as a
+    prefix) and limit (default 20, max 100). Snippets are HTML with the
+    matches in <mark>.
+    """
+    limit = request.args.get("limit", update_search.SEARCH_LIMIT, type=int)
+    if limit is None or not 1 <= limit <= update_search.MAX_SEARCH_LIMIT:
+        return api_error(f"limit must be between 1 and {update_search.MAX_SEARCH_LIMIT}")
+    started = time.perf_counter()
+    try:
+        results = update_search.search(get_db(), request.args.get("q", ""), limit)
+    except ValueError as e:
+        return api_error(str(e))
+    return jsonify({
+        "query": request.args.get("q", ""),
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    })
 
 # ---------- INVENTORY TRACKING ----------
 @app.route("/inventory")
@@ -407,29 +837,11 @@ def inventory():
     """)
     
     # Calculate statistics
-    total_items = len(snacks)
-    total_stock = query_db("SELECT SUM(stock) FROM snacks", one=True)
-    total_stock_count = total_stock[0] if total_stock and total_stock[0] else 0
-    
-    low_stock = query_db("SELECT COUNT(*) FROM snacks WHERE stock < 10", one=True)
-    low_stock_count = low_stock[0] if low_stock else 0
-    
-    out_of_stock = query_db("SELECT COUNT(*) FROM snacks WHERE stock = 0", one=True)
-    out_of_stock_count = out_of_stock[0] if out_of_stock else 0
-    
-    expiring_soon = query_db("""
-        SELECT COUNT(*) FROM snacks 
-        WHERE (julianday(expiry_date) - julianday('now')) <= 7
-    """, one=True)
-    expiring_count = expiring_soon[0] if expiring_soon else 0
+    stats = models.get_inventory_stats(expiring_days=7)
     
     return render_template("inventory.html", 
                          snacks=snacks,
-                         total_items=total_items,
-                         total_stock=total_stock_count,
-                         low_stock=low_stock_count,
-                         out_of_stock=out_of_stock_count,
-                         expiring=expiring_count)
+                         **stats)
 
 # ---------- ANALYTICS DASHBOARD ----------
 @app.route("/analytics")
@@ -439,80 +851,89 @@ def analytics():
     # Get all vendor updates
     updates = query_db("SELECT * FROM updates ORDER BY time DESC LIMIT 50")
     
-    # Get snack popularity
-    popularity = query_db("""
-        SELECT info, COUNT(*) as count 
-        FROM updates 
-        GROUP BY info 
-        ORDER BY count DESC
-    """)
-    
-    # Get vendor activity
-    vendor_activity = query_db("""
-        SELECT vendor, COUNT(*) as count 
-        FROM updates 
-        GROUP BY vendor 
-        ORDER BY count DESC
-    """)
+    # Snack popularity, vendor and machine activity come from the
+    # trigger-maintained rollups rather than grouping the whole log
+    conn = get_db()
+    popularity = rollups.top_counts(conn, "snack")
+    vendor_activity = rollups.top_counts(conn, "vendor")
+    machine_activity = rollups.top_counts(conn, "machine")
     
-    # Get machine activity
-    machine_activity = query_db("""
-        SELECT machine, COUNT(*) as count 
-        FROM updates 
-        GROUP BY machine 
-        ORDER BY count DESC
-    """)
-    
-    # Generate chart if updates exist
-    chart_path = "static/charts/popularity.png"
+    # Chart for the current top items; re-rendered only if the data changed
+    chart_key = None
     if popularity and len(popularity) > 0:
-        try:
-            import generate_chart
-            importlib.reload(generate_chart)
-        except Exception as e:
-            print(f"Chart generation failed: {e}")
+        chart_key = cached_popularity_chart(popularity[:CHART_LIMIT])
     
     return render_template("analytics.html",
                          updates=updates,
                          popularity=popularity,
                          vendor_activity=vendor_activity,
                          machine_activity=machine_activity,
-                         chart_exists=os.path.exists(chart_path))
+                         chart_key=chart_key,
+                         chart_status=render_queue.status("popularity"))
+
+TRENDS_DEFAULT_DAYS = 30
+
+@app.route("/api/analytics/trends")
+@login_required()
+def api_trends():
+    """
+    Update counts bucketed by hour, day or week over a date range, one
+    series per machine, vendor or snack. Defaults to daily, per machine,
+    over the last 30 days.
+    """
+    bucket = request.args.get("bucket", "day")
+    dimension = request.args.get("dimension", "machine")
+    top = request.args.get("top", 5, type=int)
+    if top is None or not 1 <= top <= 20:
+        return api_error("top must be between 1 and 20")
+    try:
+        end = date.fromisoformat(request.args["end"]) if request.args.get("end") else date.today()
+        start = (date.fromisoformat(request.args["start"]) if request.args.get("start")
+                 else end - timedelta(days=TRENDS_DEFAULT_DAYS - 1))
+    except ValueError:
+        return api_error("start and end must be YYYY-MM-DD dates")
+    try:
+        payload = rollups.trends(get_db(), bucket, start, end, dimension, top)
+    except ValueError as e:
+        return api_error(str(e))
+    return conditional_json(app, request, payload)
 
 # ---------- POPULARITY CHART ----------
 @app.route("/popularity_chart")
 @login_required()
 def popularity_chart():
     """Display snack popularity analytics"""
-    chart_path = "static/charts/popularity.png"
-    
-    # Try to generate chart if it doesn't exist
-    if not os.path.exists(chart_path):
-        try:
-            import generate_chart
-            importlib.reload(generate_chart)
-        except Exception as e:
-            print(f"Chart generation failed: {e}")
-            flash("No analytics data available yet. Vendor updates are needed to generate charts.", "info")
-            # Redirect based on role
-            role = session.get("role")
-            if role == "admin":
-                return redirect(url_for("admin_page"))
-            elif role == "vendor":
-                return redirect(url_for("vendor_update"))
-            else:
-                return redirect(url_for("dashboard"))
-    
     # Get update statistics
-    stats = query_db("""
-        SELECT info, COUNT(*) as count 
-        FROM updates 
-        GROUP BY info 
-        ORDER BY count DESC 
-        LIMIT 10
-    """)
+    stats = rollups.top_counts(get_db(), "snack", CHART_LIMIT)
     
-    return render_template("popularity_chart.html", stats=stats, chart_exists=os.path.exists(chart_path))
+    # Queue the chart if it isn't rendered yet
+    chart_key = cached_popularity_chart(stats)
+    if not chart_key:
+        flash("The analytics chart is being generated. Check back in a few seconds.", "info")
+        # Redirect based on role
+        role = session.get("role")
+        if role == "admin":
+            return redirect(url_for("admin_page"))
+        elif role == "vendor":
+            return redirect(url_for("vendor_update"))
+        else:
+            return redirect(url_for("dashboard"))
+    
+    return render_template("popularity_chart.html", stats=stats, chart_key=chart_key)
+
+@app.route("/charts/popularity/<key>.png")
+@login_required()
+def chart_image(key):
+    """Cached chart by content hash; immutable, so clients revalidate with ETag"""
+    path = chart_cache.get(key) if re.fullmatch(r"[0-9a-f]{32}", key) else None
+    if not path:
+        return "Chart not found", 404
+    response = send_file(path, mimetype="image/png", etag=key, conditional=True)
+    response.cache_control.no_cache = None
+    response.cache_control.private = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response
 
 # ---------- QR ACCESS ----------
 @app.route("/qr_access")
@@ -525,38 +946,226 @@ def qr_access():
 @app.route('/qr_image/<int:machine_id>')
 @login_required()
 def qr_image(machine_id):
-    path = f"static/qrcodes/machine_{machine_id}.png"
-    if os.path.exists(path):
-        return send_file(path, mimetype='image/png')
-    return "QR image not found", 404
+    """
+    QR code rendered on demand from the machine record (?format=png|svg).
+    Bytes are cached in memory keyed by payload hash, so the ETag changes
+    whenever the encoded URL does.
+    """
+    fmt = request.args.get("format", "png").lower()
+    if fmt not in generate_qr.QR_MIMETYPES:
+        return "Unsupported QR format", 400
+    if not query_db("SELECT 1 FROM machines WHERE id=?", (machine_id,), one=True):
+        return "QR image not found", 404
+
+    payload = generate_qr.machine_url(machine_id)
+    etag = f"{generate_qr.payload_hash(payload)}-{fmt}"
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    image = qr_cache.get(etag)
+    if image is None:
+        image = generate_qr.render_qr_bytes(payload, fmt)
+        qr_cache.put(etag, image)
+        # Rewrite the file when it is missing or was made for another URL
+        if fmt == "png" and Config.QR_PERSIST_ON_DEMAND and generate_qr.stale_machine_ids(get_db(), [machine_id]):
+            try:
+                generate_qr.persist_qr_png(machine_id, image)
+            except OSError as e:
+                print(f"Could not save QR code for machine {machine_id}: {e}")
+
+    response = app.response_class(image, mimetype=generate_qr.QR_MIMETYPES[fmt])
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
+
+@app.route("/qr_sheets.pdf")
+@login_required(role="admin")
+def qr_sheets_pdf():
+    """Printable label sheets for every machine, streamed page by page"""
+    page = request.args.get("page", "a4")
+    if page not in qr_sheets.PAGE_SIZES:
+        page = "a4"
+    columns = min(max(request.args.get("columns", 3, type=int), 1), 10)
+    rows = min(max(request.args.get("rows", 4, type=int), 1), 15)
+    layout = qr_sheets.SheetLayout(page=page, columns=columns, rows=rows)
+
+    def generate():
+        with pool.connection() as conn:
+            pages = qr_sheets.iter_pages(qr_sheets.iter_machines(conn), layout)
+            yield from qr_sheets.iter_pdf(pages, layout)
+
+    return app.response_class(
+        stream_with_context(generate()),
+        mimetype="application/pdf",
+        headers={"Content-Disposition": "attachment; filename=qr_sheets.pdf"},
+    )
 
 @app.route("/qr/<int:machine_id>")
 @login_required()
 def qr(machine_id):
     machine = query_db("SELECT * FROM machines WHERE id=?", (machine_id,), one=True)
-    filepath = f"static/qrcodes/machine_{machine_id}.png"
     
     if not machine:
         flash("Machine not found!", "danger")
         return redirect(url_for("qr_access"))
     
-    if os.path.exists(filepath):
-        return render_template("qr_display.html", machine=machine, qr_path=filepath)
-    
-    flash("QR code not found! Please regenerate QR codes.", "warning")
-    return redirect(url_for("qr_access"))
+    return render_template("qr_display.html", machine=machine)
 
 # ---------- API ENDPOINTS ----------
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+def api_error(message, status=400):
+    return jsonify({"error": message}), status
+
 @app.route("/api/snacks")
 @login_required()
 def api_snacks():
-    snacks = query_db("SELECT id, name, stock, expiry_date FROM snacks")
-    return jsonify([{
-        "id": s[0],
-        "name": s[1],
-        "stock": s[2],
-        "expiry_date": s[3]
-    } for s in snacks])
+    """
+    Snacks as a JSON array, keyset-paginated by id.
+
+    Query params:
+      limit            page size (default 100, max 1000)
+      cursor           opaque cursor from the previous page's Link header
+      category         exact category match
+      low_stock        'true' for items with stock below 10
+      expiring_within  items expiring within N days
+      fields           comma-separated subset of id,name,stock,expiry_date,price,category
+
+    The next page is linked via `Link: <...>; rel="next"` and X-Next-Cursor.
+    Responses carry an ETag for conditional GETs.
+    """
+    limit = request.args.get("limit", API_PAGE_SIZE, type=int)
+    if limit is None or not 1 <= limit <= API_MAX_PAGE_SIZE:
+        return api_error(f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+
+    after_id = 0
+    if request.args.get("cursor"):
+        try:
+            after_id = int(decode_cursor(request.args["cursor"])["after"])
+        except (ValueError, KeyError, TypeError):
+            return api_error("Invalid cursor")
+
+    fields = ["id", "name", "stock", "expiry_date"]
+    if request.args.get("fields"):
+        fields = [f.strip() for f in request.args["fields"].split(",") if f.strip()]
+        unknown = [f for f in fields if f not in models.SNACK_FIELDS]
+        if unknown or not fields:
+            return api_error(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(models.SNACK_FIELDS)}")
+
+    expiring_days = None
+    if request.args.get("expiring_within"):
+        expiring_days = request.args.get("expiring_within", type=int)
+        if expiring_days is None:
+            return api_error("expiring_within must be a number of days")
+
+    low_stock = request.args.get("low_stock", "").lower() in ("1", "true", "yes")
+
+    rows, next_after_id = models.get_snacks_page(
+        fields=fields,
+        after_id=after_id,
+        limit=limit,
+        category=request.args.get("category") or None,
+        low_stock=low_stock,
+        expiring_days=expiring_days,
+    )
+
+    headers = {}
+    if next_after_id is not None:
+        cursor = encode_cursor({"after": next_after_id})
+        args = request.args.to_dict()
+        args["cursor"] = cursor
+        headers["Link"] = f'<{url_for("api_snacks", **args)}>; rel="next"'
+        headers["X-Next-Cursor"] = cursor
+
+    return conditional_json(app, request, rows, headers=headers)
+
+CHANGES_PAGE_SIZE = 500
+
+@app.route("/api/changes")
+@login_required()
+def api_changes():
+    """
+    Snack and machine changes after a version watermark, oldest first.
+    Pass the returned `next_since` back as `since` to continue; a client
+    that starts from since=0 can rebuild the full catalog from the log.
+    """
+    since = request.args.get("since", 0, type=int)
+    limit = request.args.get("limit", CHANGES_PAGE_SIZE, type=int)
+    if since is None or since < 0:
+        return api_error("since must be a non-negative version")
+    if limit is None or not 1 <= limit <= API_MAX_PAGE_SIZE:
+        return api_error(f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+
+    rows = query_db("""
+        SELECT version, entity, entity_id, op, data, changed_at
+        FROM changes
+        WHERE version > ?
+        ORDER BY version
+        LIMIT ?
+    """, (since, limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = [{
+        "version": r[0],
+        "entity": r[1],
+        "id": r[2],
+        "op": r[3],
+        "data": json.loads(r[4]) if r[4] else None,
+        "changed_at": r[5]
+    } for r in rows]
+
+    return conditional_json(app, request, {
+        "changes": changes,
+        "next_since": rows[-1][0] if rows else since,
+        "has_more": has_more
+    })
+
+@app.route("/api/chart_status")
+@login_required()
+def api_chart_status():
+    """Background render status for the popularity chart"""
+    status = render_queue.status("popularity")
+    latest = chart_cache.latest_key
+    status["chart_url"] = url_for("chart_image", key=latest) if latest else None
+    return jsonify(status)
+
+@app.route("/api/db_pool")
+@login_required(role="admin")
+def api_db_pool():
+    """Connection pool stats for sizing the pool under load"""
+    return jsonify(pool.stats())
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus scrape endpoint. Needs `Authorization: Bearer <METRICS_TOKEN>`
+    when METRICS_TOKEN is set, or an admin session.
+    """
+    token = Config.METRICS_TOKEN
+    authorized = token and secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    if not authorized and session.get("role") != "admin":
+        return app.response_class("Forbidden\n", status=403, mimetype="text/plain")
+
+    return app.response_class(metrics.prometheus(pool.stats()),
+                              content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/admin/debug")
+@login_required(role="admin")
+def debug_metrics():
+    """Slowest routes and queries, likely N+1 loops and the slow query log"""
+    return render_template("debug.html", stats=metrics.snapshot(), n_plus_one=N_PLUS_ONE_REPEATS)
+
+@app.route("/admin/debug/reset", methods=["POST"])
+@login_required(role="admin")
+def reset_metrics():
+    metrics.reset()
+    flash("Metrics reset.", "success")
+    return redirect(url_for("debug_metrics"))
 
 # ---------- ERROR HANDLERS ----------
 @app.errorhandler(404)
@@ -569,9 +1178,9 @@ def internal_error(e):
 
 # ---------- RUN APP ----------
 if __name__ == "__main__":
-    if not os.path.exists(DB):
-        print(f"Warning: {DB} not found. Running database initialization...")
-        import database
+    # Seed demo data into a fresh database
+    import database
+    database.init_db(DB)
     
     # Ensure required directories exist
     os.makedirs("static/qrcodes", exist_ok=True)
@@ -0,0 +1,396 @@
+"""
+Benchmark harness for the core routes
+Seeds a scratch database at a chosen scale, drives the main routes with
+concurrent clients and reports throughput and p50/p95/p99 latency per
+route. Results are saved as JSON, tagged with the git commit, so runs can
+be compared between commits with --compare.
+
+Each scale gets its own directory under bench_data/ (the app runs with it
+as the working directory, so the real database.db is never touched),
+filled by generate_data.py. The seeded database is kept as pristine.db
+and every run starts from a fresh copy of it, since the vendor_update
+route writes to the database. It is reseeded when the scale, seed or
+generator version changes; --reseed forces a fresh one. Results under
+bench_results/ are local and not committed.
+
+Usage:
+    python benchmark.py --scale small
+    python benchmark.py --scale medium --clients 16 --requests 400
+    python benchmark.py --scale small --mode wsgi
+    python benchmark.py --scale small --compare bench_results/<earlier>.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+
+SCALES = {
+    "small": {"updates": 1_000, "snacks": 10_000, "machines": 5_000},
+    "medium": {"updates": 100_000, "snacks": 10_000, "machines": 5_000},
+    "large": {"updates": 1_000_000, "snacks": 10_000, "machines": 5_000},
+}
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Untouched copy of the seeded database, next to seed.json
+PRISTINE = "pristine.db"
+
+# Demo users from database.seed_sample_data()
+USERS = {
+    "admin": ("admin", "admin123"),
+    "vendor": ("vendor1", "vendor123"),
+    "employee": ("employee1", "emp123"),
+}
+
+
+# ---------- SEEDING ----------
+def seed(scale, seed_value):
+    """
+    Fill database.db in the current directory: demo users, then a
+    generated fleet and update history at the scale's size.
+    """
+    import database
+    import generate_data
+    from db_pool import connect
+
+    counts = SCALES[scale]
+    database.init_db()
+    conn = connect("database.db")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")
+    try:
+        generate_data.generate(conn, counts["machines"], counts["snacks"], counts["updates"], seed=seed_value)
+    finally:
+        conn.close()
+
+
+def remove_database(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def copy_database(source, target):
+    """Consistent copy of an SQLite database, WAL contents included."""
+    remove_database(target)
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def prepare(workdir, scale, seed_value, reseed=False):
+    """
+    chdir into workdir and leave a database.db there that is a fresh copy
+    of the pristine seeded database for scale, seeding it first if needed.
+    """
+    from generate_data import GENERATOR_VERSION
+
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    wanted = {"scale": scale, "seed": seed_value, "generator": GENERATOR_VERSION, **SCALES[scale]}
+    try:
+        with open("seed.json") as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        current = None
+    if current == wanted and os.path.exists(PRISTINE) and not reseed:
+        print(f"♻️  Reusing seeded {scale} database in {workdir}")
+    else:
+        remove_database(PRISTINE)
+        remove_database("database.db")
+        print(f"🌱 Seeding {scale} database ({SCALES[scale]['updates']:,} updates, "
+              f"{SCALES[scale]['snacks']:,} snacks, {SCALES[scale]['machines']:,} machines)...")
+        started = time.perf_counter()
+        seed(scale, seed_value)
+        copy_database("database.db", PRISTINE)
+        with open("seed.json", "w") as f:
+            json.dump(wanted, f)
+        print(f"✅ Seeded in {time.perf_counter() - started:.1f}s")
+
+    # Runs write to database.db, so each one starts from the pristine copy
+    copy_database(PRISTINE, "database.db")
+
+
+# ---------- CLIENTS ----------
+class TestClientDriver:
+    """In-process requests through Flask's test client."""
+
+    name = "client"
+
+    def __init__(self, app):
+        self.app = app
+
+    def client(self, role=None):
+        client = self.app.test_client()
+        if role:
+            username, password = USERS[role]
+            client.post("/login", data={"username": username, "password": password})
+        return client
+
+    def request(self, client, method, path, data=None):
+        return client.open(path, method=method, data=data).status_code
+
+    def close(self):
+        pass
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class WsgiDriver:
+    """Real HTTP requests against a threaded local WSGI server."""
+
+    name = "wsgi"
+
+    def __init__(self, app):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def client(self, role=None):
+        opener = urllib.request.build_opener(
+            _NoRedirect(), urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        if role:
+            username, password = USERS[role]
+            self.request(opener, "POST", "/login", {"username": username, "password": password})
+        return opener
+
+    def request(self, opener, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with opener.open(urllib.request.Request(self.base + path, data=body, method=method)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def close(self):
+        self.server.shutdown()
+
+
+# ---------- SCENARIOS ----------
+def vendor_update_form(rng, machines, snacks):
+    items = ", ".join(f"{rng.choice(snacks)} x{rng.randint(1, 40)}" for _ in range(rng.randint(1, 3)))
+    return {"machine": rng.choice(machines), "info": f"Restocked {items}"}
+
+
+def scenarios(machines, snacks):
+    """
+    (name, role, method, path, form builder, expected status). A role of
+    None means every request gets a fresh, logged-out client.
+    """
+    username, password = USERS["employee"]
+    return [
+        ("login", None, "POST", "/login", lambda rng: {"username": username, "password": password}, 302),
+        ("dashboard", "employee", "GET", "/dashboard", None, 200),
+        ("inventory", "admin", "GET", "/inventory", None, 200),
+        ("analytics", "admin", "GET", "/analytics", None, 200),
+        ("vendor_update", "vendor", "POST", "/vendor_update",
+         lambda rng: vendor_update_form(rng, machines, snacks), 302),
+        ("api_snacks", "admin", "GET", "/api/snacks?limit=100", None, 200),
+    ]
+
+
+def run_scenario(driver, scenario, clients, requests, warmup, seed_value):
+    """Fire `requests` requests from `clients` threads; returns the timings."""
+    name, role, method, path, form, expected = scenario
+    latencies, errors = [], []
+    lock = threading.Lock()
+    remaining = [requests]
+    ready = threading.Barrier(clients + 1)
+
+    def worker(index):
+        rng = random.Random(f"{seed_value}-{name}-{index}")
+        client = driver.client(role) if role else None
+        for _ in range(warmup):
+            driver.request(client or driver.client(), method, path, form(rng) if form else None)
+        ready.wait()
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            target = client or driver.client()
+            data = form(rng) if form else None
+            started = time.perf_counter()
+            status = driver.request(target, method, path, data)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status != expected:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_statuses": sorted(set(errors)),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "mean_ms": round(float(ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+# ---------- REPORTING ----------
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=HERE,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results):
+    print(f"\n{'route':<16}{'req':>7}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['requests']:>7}{r['errors']:>6}{r['throughput_rps']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def compare(results, baseline_path, threshold):
+    """Print p95/throughput changes against a saved run; returns the regressed routes."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline['meta']['commit']} ({baseline_path}):")
+    regressed = []
+    for name, r in results.items():
+        old = baseline["results"].get(name)
+        if not old:
+            print(f"   {name:<16} (not in baseline)")
+            continue
+        p95 = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        rps = (r["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100 if old["throughput_rps"] else 0.0
+        flag = "⚠️ " if p95 > threshold else "  "
+        if p95 > threshold:
+            regressed.append(name)
+        print(f" {flag}{name:<16} p95 {old['p95_ms']:>9} -> {r['p95_ms']:>9} ms ({p95:+.1f}%)   "
+              f"rps {old['throughput_rps']} -> {r['throughput_rps']} ({rps:+.1f}%)")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the core routes against a seeded database")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per route")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per client per route")
+    parser.add_argument("--mode", choices=("client", "wsgi"), default="client",
+                        help="Flask test client in-process, or HTTP against a local WSGI server")
+    parser.add_argument("--routes", help="Comma-separated subset of routes to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reseed", action="store_true", help="Rebuild the seeded database")
+    parser.add_argument("--workdir", default=os.path.join(HERE, "bench_data"))
+    parser.add_argument("--out", help="Results file (default bench_results/<scale>-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="p95 increase (%%) that counts as a regression in --compare")
+    args = parser.parse_args(argv)
+
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    commit = git_revision()
+    out = os.path.abspath(args.out or os.path.join(
+        HERE, "bench_results", f"{args.scale}-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    ))
+    prepare(os.path.join(os.path.abspath(args.workdir), args.scale), args.scale, args.seed, args.reseed)
+
+    # Imported after the chdir so the app opens the seeded database
+    import app as webapp
+    import generate_data
+    conn = sqlite3.connect("database.db")
+    machines = [row[0] for row in conn.execute("SELECT name FROM machines")]
+    snacks = [row[0] for row in conn.execute("SELECT name FROM snacks")]
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("updates", "update_items", "snacks", "machines", "machine_inventory")}
+    conn.close()
+
+    chosen = scenarios(machines, snacks)
+    if args.routes:
+        wanted = {name.strip() for name in args.routes.split(",")}
+        unknown = wanted - {s[0] for s in chosen}
+        if unknown:
+            print(f"❌ ERROR: Unknown route(s): {', '.join(sorted(unknown))}")
+            sys.exit(1)
+        chosen = [s for s in chosen if s[0] in wanted]
+
+    driver = (WsgiDriver if args.mode == "wsgi" else TestClientDriver)(webapp.app)
+    results = {}
+    try:
+        for scenario in chosen:
+            print(f"⏱️  {scenario[0]}: {args.requests} requests from {args.clients} clients...")
+            results[scenario[0]] = run_scenario(driver, scenario, args.clients, args.requests,
+                                                args.warmup, args.seed)
+    finally:
+        driver.close()
+        # Let chart renders queued by vendor updates finish before exiting
+        deadline = time.monotonic() + 30
+        while webapp.render_queue.status("popularity")["state"] != "idle" and time.monotonic() < deadline:
+            time.sleep(0.2)
+
+    print_results(results)
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "scale": args.scale,
+            "seed": args.seed,
+            "generator": generate_data.GENERATOR_VERSION,
+            "counts": counts,
+            "mode": driver.name,
+            "clients": args.clients,
+            "requests_per_route": args.requests,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {out}")
+
+    if compare_path and compare(results, compare_path, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
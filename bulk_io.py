@@ -0,0 +1,365 @@
+"""
+Bulk import / export
+Streams snacks, machines and updates in and out as CSV or NDJSON.
+Imports are validated row by row and written in chunks, one executemany
+and one commit per chunk; exports are generators over fetchmany() so
+memory stays flat however large the table is.
+
+Usage:
+    python bulk_io.py import snacks catalog.csv
+    python bulk_io.py export updates --format ndjson --out updates.ndjson
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from itertools import islice
+
+from db_pool import get_pool, DB
+from expiry import normalize_expiry_date
+from update_parser import index_updates
+
+FORMATS = ("csv", "ndjson")
+CHUNK_SIZE = 500
+EXPORT_BATCH = 1000
+MAX_REPORTED_ERRORS = 100
+
+MACHINE_STATUSES = ("active", "maintenance", "inactive")
+UPDATE_TYPES = ("restock", "maintenance", "issue")
+
+
+# ---------- ROW VALIDATION ----------
+def _text(record, field, required=False, default=None):
+    value = record.get(field)
+    value = str(value).strip() if value is not None else ""
+    if not value:
+        if required:
+            raise ValueError(f"{field} is required")
+        return default
+    return value
+
+
+def _number(record, field, cast, default):
+    value = record.get(field)
+    if value is None or str(value).strip() == "":
+        return default
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number, got {value!r}")
+    if number < 0:
+        raise ValueError(f"{field} can't be negative")
+    return number
+
+
+def _id(record):
+    return _number(record, "id", int, None)
+
+
+def clean_snack(record):
+    expiry = normalize_expiry_date(record.get("expiry_date"))
+    if expiry is None:
+        raise ValueError(f"expiry_date is missing or invalid: {record.get('expiry_date')!r}")
+    return (
+        _id(record),
+        _text(record, "name", required=True),
+        _number(record, "stock", int, 0),
+        expiry,
+        _number(record, "price", float, 0.0),
+        _text(record, "category", default="General"),
+    )
+
+
+def _coordinate(record, field, limit):
+    value = record.get(field)
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number, got {value!r}")
+    if not -limit <= number <= limit:
+        raise ValueError(f"{field} must be between -{limit} and {limit}")
+    return number
+
+
+def clean_machine(record):
+    status = _text(record, "status", default="active").lower()
+    if status not in MACHINE_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(MACHINE_STATUSES)}")
+    return (
+        _id(record),
+        _text(record, "name", required=True),
+        _text(record, "location", required=True),
+        status,
+        _coordinate(record, "latitude", 90),
+        _coordinate(record, "longitude", 180),
+    )
+
+
+def clean_update(record):
+    update_type = _text(record, "update_type", default="restock").lower()
+    if update_type not in UPDATE_TYPES:
+        raise ValueError(f"update_type must be one of {', '.join(UPDATE_TYPES)}")
+    time_str = _text(record, "time")
+    if time_str is None:
+        time_str = datetime.now().isoformat(timespec="seconds")
+    else:
+        try:
+            time_str = datetime.fromisoformat(time_str).isoformat(timespec="seconds")
+        except ValueError:
+            raise ValueError(f"time must be an ISO timestamp, got {time_str!r}")
+    return (
+        _id(record),
+        _text(record, "vendor", required=True),
+        _text(record, "machine", required=True),
+        _text(record, "info", required=True),
+        time_str,
+        update_type,
+    )
+
+
+# Column order matches what each clean_* function returns; id comes first
+# so rows carrying one can upsert and an export re-imports cleanly
+TABLES = {
+    "snacks": (("id", "name", "stock", "expiry_date", "price", "category"), clean_snack),
+    "machines": (("id", "name", "location", "status", "latitude", "longitude"), clean_machine),
+    "updates": (("id", "vendor", "machine", "info", "time", "update_type"), clean_update),
+}
+
+
+# ---------- READERS ----------
+def iter_csv(stream):
+    """Records from a CSV text stream with a header row."""
+    yield from csv.DictReader(stream)
+
+
+def iter_ndjson(stream):
+    """Records from newline-delimited JSON; blank lines are skipped."""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        # Bad lines are yielded as errors so they're reported against their
+        # row number instead of aborting the whole import
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"invalid JSON: {e}")
+            continue
+        yield record if isinstance(record, dict) else ValueError("not a JSON object")
+
+
+def iter_records(stream, fmt):
+    if fmt == "csv":
+        return iter_csv(stream)
+    if fmt == "ndjson":
+        return iter_ndjson(stream)
+    raise ValueError(f"Unknown format '{fmt}'")
+
+
+def format_for(filename, default="csv"):
+    """Guess the format from a file name's extension."""
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    if ext in ("ndjson", "jsonl"):
+        return "ndjson"
+    return ext if ext in FORMATS else default
+
+
+# ---------- IMPORT ----------
+def _insert_sql(table):
+    columns, _ = TABLES[table]
+    data_columns = columns[1:]
+    updates = ", ".join(f"{c} = excluded.{c}" for c in data_columns)
+    with_id = f"""
+        INSERT INTO {table} ({", ".join(columns)})
+        VALUES ({", ".join("?" * len(columns))})
+        ON CONFLICT(id) DO UPDATE SET {updates}
+    """
+    without_id = f"""
+        INSERT INTO {table} ({", ".join(data_columns)})
+        VALUES ({", ".join("?" * len(data_columns))})
+    """
+    return with_id, without_id
+
+
+def _index_written_updates(conn, max_before, keyed):
+    """Parse the update rows a chunk just wrote into update_items."""
+    index_updates(conn, "id > ? OR id IN (SELECT value FROM json_each(?))",
+                  (max_before, json.dumps([row[0] for _, row in keyed])))
+
+
+# Run inside each chunk's transaction, after its rows are written
+AFTER_WRITE = {
+    "updates": _index_written_updates,
+}
+
+
+def _write_chunk(conn, table, sql, chunk):
+    """Write one chunk as a single transaction; returns rows that failed."""
+    with_id, without_id = sql
+    after_write = AFTER_WRITE.get(table)
+    max_before = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0] if after_write else 0
+    keyed = [(line, row) for line, row in chunk if row[0] is not None]
+    unkeyed = [row[1:] for _, row in chunk if row[0] is None]
+    try:
+        if keyed:
+            conn.executemany(with_id, [row for _, row in keyed])
+        if unkeyed:
+            conn.executemany(without_id, unkeyed)
+        if after_write:
+            after_write(conn, max_before, keyed)
+        conn.commit()
+        return []
+    except sqlite3.IntegrityError:
+        conn.rollback()
+
+    # A constraint failed somewhere in the chunk: redo it row by row so
+    # the good rows still land and each bad one gets its own error
+    failed = []
+    for line, row in chunk:
+        try:
+            if row[0] is not None:
+                conn.execute(with_id, row)
+            else:
+                conn.execute(without_id, row[1:])
+        except sqlite3.IntegrityError as e:
+            failed.append({"row": line, "error": str(e)})
+    if after_write:
+        after_write(conn, max_before, keyed)
+    conn.commit()
+    return failed
+
+
+def import_records(conn, table, records, chunk_size=CHUNK_SIZE):
+    """
+    Validate and insert records (dicts) into table.
+    Rows with an id upsert, rows without one are appended. Invalid rows are
+    skipped and reported by their 1-based record number; the first
+    MAX_REPORTED_ERRORS are kept.
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}'")
+    _, clean = TABLES[table]
+    sql = _insert_sql(table)
+    result = {"table": table, "imported": 0, "failed": 0, "errors": []}
+
+    def fail(errors):
+        result["failed"] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(result["errors"])
+        result["errors"].extend(errors[:max(room, 0)])
+
+    records = enumerate(records, start=1)
+    while True:
+        batch = list(islice(records, chunk_size))
+        if not batch:
+            break
+        chunk, errors = [], []
+        for line, record in batch:
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                chunk.append((line, clean(record)))
+            except ValueError as e:
+                errors.append({"row": line, "error": str(e)})
+        if chunk:
+            failed = _write_chunk(conn, table, sql, chunk)
+            result["imported"] += len(chunk) - len(failed)
+            errors.extend(failed)
+        fail(errors)
+    return result
+
+
+def import_stream(conn, table, stream, fmt="csv", chunk_size=CHUNK_SIZE):
+    """import_records() over a CSV or NDJSON text stream."""
+    return import_records(conn, table, iter_records(stream, fmt), chunk_size)
+
+
+# ---------- EXPORT ----------
+def iter_export(conn, table, fmt="csv", batch_size=EXPORT_BATCH):
+    """
+    Yield a table as CSV or NDJSON text, one chunk per fetchmany() batch.
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}'")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'")
+    columns, _ = TABLES[table]
+
+    cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(columns)
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        if fmt == "csv":
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(columns, row))) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import / export snacks, machines and updates")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="Load a CSV or NDJSON file into a table")
+    imp.add_argument("table", choices=sorted(TABLES))
+    imp.add_argument("file", help="Input file, or - for stdin")
+    imp.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    imp.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    exp = sub.add_parser("export", help="Write a table out as CSV or NDJSON")
+    exp.add_argument("table", choices=sorted(TABLES))
+    exp.add_argument("--format", choices=FORMATS, default="csv")
+    exp.add_argument("--out", default="-", help="Output file, or - for stdout")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(DB):
+        print(f"❌ ERROR: Database '{DB}' not found!")
+        sys.exit(1)
+
+    with get_pool(DB).connection() as conn:
+        if args.command == "import":
+            fmt = args.format or format_for(args.file)
+            if args.file == "-":
+                result = import_stream(conn, args.table, sys.stdin, fmt, args.chunk_size)
+            else:
+                with open(args.file, encoding="utf-8-sig", newline="") as f:
+                    result = import_stream(conn, args.table, f, fmt, args.chunk_size)
+
+            print(f"✅ Imported {result['imported']} row(s) into {args.table}")
+            if result["failed"]:
+                print(f"⚠️  {result['failed']} row(s) rejected:")
+                for error in result["errors"]:
+                    print(f"   row {error['row']}: {error['error']}")
+        else:
+            out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8", newline="")
+            try:
+                for chunk in iter_export(conn, args.table, args.format):
+                    out.write(chunk)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            if out is not sys.stdout:
+                print(f"✅ {args.table} exported to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
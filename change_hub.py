@@ -0,0 +1,97 @@
+"""
+In-process change notification hub
+Writers publish on a channel (e.g. "snacks" or "machine:3"), optionally
+naming the keys (snack ids) they touched; readers such as the
+machine_view event stream block until one of their channels moves on and
+then re-read only those keys, instead of polling the database.
+"""
+
+import threading
+from collections import deque
+
+# Publishes remembered per channel; a reader further behind than this resyncs
+HISTORY_SIZE = 256
+
+
+class ChangeHub:
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._history = {}   # channel -> deque of (version, frozenset of keys or None)
+        self._waiters = {}   # channel -> set of Events, one per blocked reader
+        self.history_size = history_size
+
+    def publish(self, channel, keys=None):
+        """
+        Bump the channel's version and wake only the readers waiting on it.
+        `keys` are the ids the write touched; None means "anything".
+        """
+        with self._lock:
+            version = self._versions[channel] = self._versions.get(channel, 0) + 1
+            history = self._history.get(channel)
+            if history is None:
+                history = self._history[channel] = deque(maxlen=self.history_size)
+            history.append((version, None if keys is None else frozenset(keys)))
+            for event in self._waiters.get(channel, ()):
+                event.set()
+
+    def versions(self, channels):
+        """Current {channel: version} for `channels`; the starting point for wait()."""
+        with self._lock:
+            return {channel: self._versions.get(channel, 0) for channel in channels}
+
+    def wait(self, since, timeout=None):
+        """
+        Block until a channel in `since` ({channel: version}) moves past the
+        version given or `timeout` seconds pass. Returns (versions, keys):
+        the new versions and the keys touched in between, or None for keys
+        if some publish didn't name them or has fallen out of the history.
+        """
+        event = threading.Event()
+        with self._lock:
+            if not self._moved(since):
+                for channel in since:
+                    self._waiters.setdefault(channel, set()).add(event)
+                waiting = True
+            else:
+                waiting = False
+        if waiting:
+            try:
+                event.wait(timeout)
+            finally:
+                with self._lock:
+                    for channel in since:
+                        waiters = self._waiters.get(channel)
+                        if waiters is not None:
+                            waiters.discard(event)
+                            if not waiters:
+                                del self._waiters[channel]
+        with self._lock:
+            current = {channel: self._versions.get(channel, 0) for channel in since}
+            return current, self._keys_since(since)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "versions": dict(self._versions),
+                "waiting": sum(len(waiters) for waiters in self._waiters.values()),
+            }
+
+    def _moved(self, since):
+        return any(self._versions.get(channel, 0) != version for channel, version in since.items())
+
+    def _keys_since(self, since):
+        keys = set()
+        for channel, seen in since.items():
+            missed = self._versions.get(channel, 0) - seen
+            if not missed:
+                continue
+            newer = [k for version, k in self._history.get(channel, ()) if version > seen]
+            if len(newer) < missed or None in newer:
+                return None
+            keys.update(*newer)
+        return keys
+
+
+hub = ChangeHub()
@@ -0,0 +1,117 @@
+"""
+Content-addressed chart cache
+Rendered charts are stored on disk under a hash of the data they show plus
+the render parameters, so unchanged data never re-renders. The store is an
+LRU bounded by entry count and total size.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class ChartCache:
+
+    def __init__(self, directory="static/charts/cache", max_entries=50,
+                 max_bytes=20 * 1024 * 1024, ext="png"):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ext = ext
+        self.latest_key = None
+        self._lock = threading.Lock()
+        # key -> size in bytes, least recently used first. Recency is kept in
+        # memory rather than by touching files, so mtime stays the render time
+        # (used as Last-Modified).
+        self._entries = OrderedDict()
+        self._total = 0
+        self._load()
+
+    @staticmethod
+    def key_for(data, **params):
+        """Stable hash of the chart's rows and render parameters."""
+        payload = json.dumps(
+            {"data": [list(row) for row in data], "params": params},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.{self.ext}")
+
+    def get(self, key):
+        """Path of the cached chart for key, or None. Marks it recently used."""
+        path = self.path(key)
+        with self._lock:
+            if not os.path.exists(path):
+                # Never rendered, or evicted by another worker
+                if key in self._entries:
+                    self._total -= self._entries.pop(key)
+                return None
+            if key not in self._entries:
+                # Rendered by another worker process
+                size = os.path.getsize(path)
+                self._entries[key] = size
+                self._total += size
+            self._entries.move_to_end(key)
+            return path
+
+    def put(self, key, image):
+        """Store rendered bytes under key and evict down to the limits."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(image)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if key in self._entries:
+                self._total -= self._entries.pop(key)
+            self._entries[key] = len(image)
+            self._total += len(image)
+            self.latest_key = key
+            self._evict()
+        return path
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "latest_key": self.latest_key,
+            }
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._total > self.max_bytes):
+            key, size = next(iter(self._entries.items()))
+            if key == self.latest_key and len(self._entries) == 1:
+                break
+            del self._entries[key]
+            self._total -= size
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def _load(self):
+        """Rebuild the index from disk, oldest first."""
+        if not os.path.isdir(self.directory):
+            return
+        suffix = f".{self.ext}"
+        found = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(suffix):
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            found.append((stat.st_mtime, name[:-len(suffix)], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total += size
+            self.latest_key = key
+        self._evict()
@@ -19,7 +19,21 @@ class Config:
     # Upload folders
     UPLOAD_FOLDER = 'static/uploads'
     QR_FOLDER = 'static/qrcodes'
+    # Base URL encoded in machine QR codes; set per deployment
+    QR_BASE_URL = os.environ.get('QR_BASE_URL', 'http://127.0.0.1:5000')
+    # QR codes rendered on demand are kept in memory; optionally also written to QR_FOLDER
+    QR_CACHE_ENTRIES = 1024
+    QR_PERSIST_ON_DEMAND = True
     CHART_FOLDER = 'static/charts'
+    # Where restock routes start, as "lat,lng"; unset starts at the most urgent machine
+    ROUTE_START = os.environ.get('ROUTE_START')
+    # query_db() calls slower than this are logged with their query plan
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    # Live machine_view streams per worker; keep well below gunicorn's --threads,
+    # since each open stream holds a thread. Extra viewers fall back to polling
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 8))
+    # Bearer token Prometheus scrapes /metrics with; admins can always view it
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
 
 class DevelopmentConfig(Config):
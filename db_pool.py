@@ -0,0 +1,324 @@
+"""
+Pooled SQLite connection manager
+Keeps long-lived, tuned connections around instead of connecting per query.
+Every statement on them can be timed through set_statement_hook().
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DB = "database.db"
+
+# Applied to every new connection. journal_mode=WAL is persistent in the
+# database file; the rest are per-connection settings.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+BUSY_TIMEOUT = 30.0
+STATEMENT_CACHE_SIZE = 256
+
+# Called as hook(conn, sql, args, seconds, rows, error) once per statement
+_statement_hook = None
+
+
+def set_statement_hook(hook):
+    """
+    Report every statement run on connections from connect() to `hook`,
+    or stop reporting with None. Process-wide.
+    """
+    global _statement_hook
+    _statement_hook = hook
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor that times each statement from execute() until its rows are
+    used up, the cursor is closed or discarded, or it runs the next one,
+    then reports it to the statement hook.
+    """
+    _pending = None   # [sql, args, seconds, rows] of the statement in flight
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        if _statement_hook is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except Exception:
+            _report(self.connection, sql, parameters, time.perf_counter() - started, 0, True)
+            raise
+        self._pending = [sql, parameters, time.perf_counter() - started, 0]
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        if _statement_hook is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        except Exception:
+            _report(self.connection, sql, (), time.perf_counter() - started, 0, True)
+            raise
+        _report(self.connection, sql, (), time.perf_counter() - started, 0, False)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def _fetched(self, started, rows, done):
+        pending = self._pending
+        if pending is not None:
+            pending[2] += time.perf_counter() - started
+            pending[3] += rows
+            if done:
+                self._finish()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            _report(self.connection, *pending, False)
+
+
+def _report(conn, sql, args, seconds, rows, error):
+    hook = _statement_hook
+    if hook is None:
+        return
+    try:
+        hook(conn, sql, args, seconds, rows, error)
+    except Exception as e:
+        # Profiling must never break the statement it measures
+        print(f"⚠️  Statement hook failed: {e}")
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors, including conn.execute()'s, are ProfiledCursors."""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    # The C shortcuts build a plain cursor; go through ours instead
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect(path=DB):
+    """
+    Open a standalone connection with the pool's tuning applied.
+    Used by one-off scripts (database setup) that don't need pooling.
+    """
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+        factory=ProfiledConnection,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PoolExhausted(sqlite3.OperationalError):
+    """Raised when no connection frees up within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections.
+
+    A thread checks out at most one connection at a time: nested
+    checkouts on the same thread reuse the connection it already holds,
+    so a Flask request and any helpers it calls share one connection.
+    """
+
+    def __init__(self, path=DB, max_connections=8, timeout=BUSY_TIMEOUT):
+        self.path = path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+        # Stats
+        self.hits = 0          # served from an idle connection
+        self.misses = 0        # had to open a new connection
+        self.reuses = 0        # nested checkout on a thread already holding one
+        self.waits = 0         # had to block for a connection to free up
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    # ---------- raw acquire / release ----------
+    def acquire(self):
+        """Take a connection from the pool, opening or waiting as needed."""
+        with self._cond:
+            if not self._idle and self._open >= self.max_connections:
+                self.waits += 1
+                started = time.monotonic()
+                ready = self._cond.wait_for(
+                    lambda: self._idle or self._open < self.max_connections,
+                    self.timeout,
+                )
+                self.wait_seconds += time.monotonic() - started
+                if not ready:
+                    self.timeouts += 1
+                    raise PoolExhausted(
+                        f"No free connection to {self.path} after {self.timeout}s"
+                    )
+
+            if self._idle:
+                self.hits += 1
+                return self._idle.pop()
+
+            self._open += 1
+            self.misses += 1
+
+        try:
+            return connect(self.path)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding any open transaction."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection: drop it instead of handing it out again
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            conn.close()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    # ---------- per-thread checkout ----------
+    def checkout(self):
+        """Return this thread's connection, acquiring one if it has none."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            with self._cond:
+                self.reuses += 1
+            return conn
+
+        conn = self.acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def checkin(self, conn):
+        """Undo one checkout(); the outermost one returns it to the pool."""
+        if getattr(self._local, "conn", None) is not conn:
+            self.release(conn)
+            return
+
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            self._local.conn = None
+            self.release(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager around checkout()/checkin()."""
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    # ---------- housekeeping ----------
+    def stats(self):
+        """Snapshot of pool usage, for sizing max_connections under load."""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "path": self.path,
+                "max_connections": self.max_connections,
+                "open": self._open,
+                "idle": idle,
+                "in_use": self._open - idle,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reuses": self.reuses,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "wait_seconds": round(self.wait_seconds, 6),
+            }
+
+    def close_all(self):
+        """Close every idle connection (connections in use are left alone)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=DB, max_connections=8):
+    """Return the process-wide pool for a database file, creating it once."""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = ConnectionPool(path, max_connections=max_connections)
+            _pools[path] = pool
+        return pool
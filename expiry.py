@@ -0,0 +1,52 @@
+"""
+Shelf-life helpers
+Expiry dates are stored as ISO 'YYYY-MM-DD' text, so "expiring within N days"
+is a plain range predicate (expiry_date <= cutoff) on an indexed column.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+# Accepted input formats, tried in order. ISO first since <input type="date">
+# always submits it.
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y/%m/%d",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%d.%m.%Y",
+)
+
+
+def today():
+    """Current date in UTC, matching SQLite's date('now')."""
+    return datetime.now(timezone.utc).date()
+
+
+def cutoff_date(days, base=None):
+    """ISO date string N days from today: the upper bound for expiry_date."""
+    return ((base or today()) + timedelta(days=days)).isoformat()
+
+
+def normalize_expiry_date(value):
+    """
+    Convert a user or legacy expiry value to 'YYYY-MM-DD'.
+    Returns None if it can't be parsed.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+
+    # Timestamps ('2024-05-01 00:00:00', '2024-05-01T10:00') keep just the date
+    try:
+        return datetime.fromisoformat(value).date().isoformat()
+    except ValueError:
+        pass
+
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
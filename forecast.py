@@ -0,0 +1,244 @@
+"""
+Demand forecasting and restock recommendations
+Loads a year of restock update_items into NumPy arrays, estimates each
+machine/snack slot's daily consumption over rolling windows and ranks the
+slots by how soon their current machine_inventory runs out.
+
+Consumption is inferred from restocks: over a window, what vendors put
+into a slot is what sold out of it. Rates are cached until a new update
+arrives (or the day rolls over); current stock is read fresh every time.
+
+Usage:
+    python forecast.py [--limit 20] [--machine "Main Lobby Machine"]
+"""
+
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from db_pool import get_pool, DB
+
+HISTORY_DAYS = 365
+# Short and long rolling windows; the larger rate wins so a recent spike
+# isn't averaged away by a quiet month
+WINDOWS = (7, 28)
+COVER_DAYS = 7          # suggested restock tops a slot up for this long
+LOAD_BATCH = 5000
+
+_cache = {"key": None, "rates": None, "events": None}
+_cache_lock = threading.Lock()
+
+
+def _history_key(conn):
+    """
+    Changes whenever update items are added or removed, and once a day.
+    Re-parsed updates get new item ids, so they change it too.
+    """
+    max_id, count = conn.execute("SELECT MAX(id), COUNT(*) FROM update_items").fetchone()
+    return (max_id or 0, count, datetime.now().date().isoformat())
+
+
+def load_restocks(conn, since, after_id=0):
+    """
+    Restock items newer than `since` (ISO time) with id above after_id, as
+    a dict of parallel arrays: machine, snack, qty and stamp (datetime64).
+    """
+    machines, snacks, quantities, times = [], [], [], []
+    cursor = conn.execute("""
+        SELECT machine_id, snack_id, quantity, time FROM update_items
+        WHERE id > ? AND time >= ? AND update_type = 'restock' AND machine_id IS NOT NULL
+    """, (after_id, since))
+    while True:
+        rows = cursor.fetchmany(LOAD_BATCH)
+        if not rows:
+            break
+        for machine_id, snack_id, qty, when in rows:
+            machines.append(machine_id)
+            snacks.append(snack_id)
+            quantities.append(qty)
+            times.append(when)
+
+    # ISO strings parse to datetime64 in one vectorized call
+    return {
+        "machine": np.array(machines, dtype=np.int64),
+        "snack": np.array(snacks, dtype=np.int64),
+        "qty": np.array(quantities, dtype=np.float64),
+        "stamp": np.array(times, dtype="datetime64[s]"),
+    }
+
+
+def _ages(stamps, now):
+    """Age of each event in days (0 = now)."""
+    age = (np.datetime64(now.replace(microsecond=0)) - stamps) / np.timedelta64(1, "D")
+    return np.maximum(age.astype(np.float64), 0.0)
+
+
+def consumption_rates(machines, snacks, quantities, age, windows=WINDOWS):
+    """
+    Daily consumption per (machine, snack) slot.
+    Returns (slot_machine_ids, slot_snack_ids, rates). A restock refills
+    what sold since the previous one, so each slot's first restock only
+    marks the start of its history. Each window's rate is the quantity
+    restocked within it divided by its length, or by the time since the
+    slot's first restock when that is shorter.
+    """
+    if len(machines) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    # One integer key per slot, then a dense slot index for bincount
+    stride = int(snacks.max()) + 1
+    keys = machines * stride + snacks
+    slots, slot_of = np.unique(keys, return_inverse=True)
+    history = np.zeros(len(slots))
+    np.maximum.at(history, slot_of, age)
+
+    # Oldest event of each slot: sort by slot, then age descending
+    order = np.lexsort((-age, slot_of))
+    starts = order[np.r_[True, slot_of[order][1:] != slot_of[order][:-1]]]
+    counted = np.ones(len(age), dtype=bool)
+    counted[starts] = False
+
+    rates = np.zeros(len(slots))
+    for window in windows:
+        in_window = counted & (age < window)
+        restocked = np.bincount(slot_of[in_window], weights=quantities[in_window], minlength=len(slots))
+        span = np.clip(history, 1.0, window)
+        rates = np.maximum(rates, restocked / span)
+
+    return slots // stride, slots % stride, rates
+
+
+def cached_rates(conn, days=HISTORY_DAYS):
+    """
+    {(machine_id, snack_id): daily rate} over the last `days` of history.
+    Recomputed only when update items change. New items are loaded
+    incrementally and appended to the cached event arrays; deletions and
+    the daily rollover force a full reload.
+    """
+    key = _history_key(conn)
+    with _cache_lock:
+        if _cache["key"] == key:
+            return _cache["rates"]
+        cached_key, events = _cache["key"], _cache["events"]
+
+    now = datetime.now()
+    since = (now - timedelta(days=days)).isoformat(timespec="seconds")
+    # Only appends since the last load (ids and count grew in step) can be
+    # applied incrementally; anything else, or a new day, reloads in full
+    appended = (
+        events is not None and cached_key[2] == key[2]
+        and key[1] - cached_key[1] == key[0] - cached_key[0] >= 0
+    )
+    if appended:
+        new = load_restocks(conn, since, after_id=cached_key[0])
+        events = {name: np.concatenate((events[name], new[name])) for name in events}
+    else:
+        events = load_restocks(conn, since)
+
+    # Drop events that aged out of the history window
+    keep = events["stamp"] >= np.datetime64(since)
+    events = {name: values[keep] for name, values in events.items()}
+
+    slot_machines, slot_snacks, slot_rates = consumption_rates(
+        events["machine"], events["snack"], events["qty"], _ages(events["stamp"], now)
+    )
+    rates = dict(zip(zip(slot_machines.tolist(), slot_snacks.tolist()), slot_rates.tolist()))
+    with _cache_lock:
+        _cache.update(key=key, rates=rates, events=events)
+    return rates
+
+
+def restock_list(conn, limit=20, machine_id=None, cover_days=COVER_DAYS):
+    """
+    Slots ranked by days until empty, soonest first, as dicts with machine,
+    snack, current qty, daily rate, days_left and a suggested restock amount.
+    Empty slots come first; slots without enough history for a rate are
+    left out unless they are empty.
+    The cached rates are exposed to SQLite as slot_rate(), so the ranking
+    and LIMIT happen in the query and only the top rows reach Python.
+    """
+    rate_of = cached_rates(conn)
+    conn.create_function("slot_rate", 2, lambda machine, snack: rate_of.get((machine, snack), 0.0),
+                         deterministic=True)
+
+    where, args = "", ()
+    if machine_id is not None:
+        where, args = "WHERE mi.machine_id = ?", (machine_id,)
+    # MATERIALIZED keeps slot_rate() to one call per slot; a flattened
+    # subquery would re-run it for the WHERE, CASE and ORDER BY
+    rows = conn.execute(f"""
+        WITH slots AS MATERIALIZED (
+            SELECT mi.machine_id, mi.snack_id, mi.qty, slot_rate(mi.machine_id, mi.snack_id) AS rate
+            FROM machine_inventory mi
+            {where}
+        ), ranked AS (
+            SELECT machine_id, snack_id, qty, rate,
+                   CASE WHEN qty <= 0 THEN 0.0 ELSE qty / rate END AS days_left
+            FROM slots
+            WHERE (qty <= 0 OR rate > 0)
+              AND EXISTS (SELECT 1 FROM machines WHERE id = slots.machine_id)
+              AND EXISTS (SELECT 1 FROM snacks WHERE id = slots.snack_id)
+            ORDER BY days_left, rate DESC
+            LIMIT ?
+        )
+        SELECT r.machine_id, m.name, r.snack_id, s.name, r.qty, r.rate, r.days_left
+        FROM ranked r
+        JOIN machines m ON m.id = r.machine_id
+        JOIN snacks s ON s.id = r.snack_id
+        ORDER BY r.days_left, r.rate DESC
+    """, args + (limit,)).fetchall()
+
+    return [{
+        "machine_id": row[0],
+        "machine": row[1],
+        "snack_id": row[2],
+        "snack": row[3],
+        "qty": row[4],
+        "daily_rate": round(row[5], 2),
+        "days_left": round(row[6], 1),
+        "suggested_restock": max(math.ceil(row[5] * cover_days - row[4]), 0),
+    } for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank machine slots by how soon they run out")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--machine", help="Only this machine (by name)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(DB):
+        print(f"❌ ERROR: Database '{DB}' not found!")
+        sys.exit(1)
+
+    with get_pool(DB).connection() as conn:
+        machine_id = None
+        if args.machine:
+            row = conn.execute("SELECT id FROM machines WHERE name=?", (args.machine,)).fetchone()
+            if not row:
+                print(f"❌ ERROR: Machine '{args.machine}' not found!")
+                sys.exit(1)
+            machine_id = row[0]
+
+        started = time.perf_counter()
+        ranked = restock_list(conn, args.limit, machine_id)
+        elapsed = time.perf_counter() - started
+
+    if not ranked:
+        print("⚠️  No slots need restocking (or there is no restock history yet).")
+        return
+    print(f"📦 Restock priorities ({elapsed:.2f}s)")
+    for item in ranked:
+        days = "empty" if item["days_left"] == 0 else f"{item['days_left']:.1f} days"
+        print(f"   {item['machine']:<28} {item['snack']:<20} qty {item['qty']:>4}  "
+              f"{item['daily_rate']:>6.2f}/day  {days:>10}  +{item['suggested_restock']}")
+
+
+if __name__ == "__main__":
+    main()
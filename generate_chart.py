@@ -1,77 +1,136 @@
-import sqlite3
-import matplotlib
-matplotlib.use("Agg")  
-import matplotlib.pyplot as plt
+"""
+Snack popularity chart
+Importable rendering API; run directly to regenerate static/charts/popularity.png
+
+    from generate_chart import render_popularity_chart
+    with get_pool(DB).connection() as conn:
+        render_popularity_chart(conn, limit=10, out_path="static/charts/popularity.png")
+"""
+
+import io
 import os
+import threading
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib import cm
+from matplotlib.figure import Figure
+
+from db_pool import get_pool
+import rollups
 
 DB = "database.db"
+CHART_PATH = "static/charts/popularity.png"
+
+# One figure per (width, height) is created on first use and cleared between
+# renders, so repeated renders skip figure/canvas setup. Figures aren't
+# thread safe, hence the lock.
+_figures = {}
+_figure_lock = threading.Lock()
+
+
+def _figure(figsize):
+    fig = _figures.get(figsize)
+    if fig is None:
+        fig = Figure(figsize=figsize)
+        _figures[figsize] = fig
+    fig.clear()
+    return fig
+
+
+def fetch_popularity(conn, limit=10):
+    """Top `limit` snacks by number of updates, as (name, count) rows."""
+    return rollups.top_counts(conn, "snack", limit)
+
+
+def draw_popularity(data, out=None, dpi=150, fmt="png", figsize=(12, 7)):
+    """
+    Render (label, count) rows as a bar chart.
+    `out` is a file path or writable binary file; when None the image is
+    returned as bytes.
+    """
+    buffer = io.BytesIO() if out is None else None
+
+    with _figure_lock:
+        if data:
+            fig = _figure(figsize)
+            ax = fig.add_subplot()
+            snacks = [row[0] for row in data]
+            counts = [row[1] for row in data]
+
+            # Create bar chart with colors
+            colors = cm.viridis([i / len(snacks) for i in range(len(snacks))])
+            bars = ax.bar(snacks, counts, color=colors, edgecolor='black', linewidth=1.2)
+
+            # Add value labels on top of bars
+            for bar in bars:
+                height = bar.get_height()
+                ax.text(bar.get_x() + bar.get_width() / 2., height,
+                        f'{int(height)}',
+                        ha='center', va='bottom', fontweight='bold', fontsize=10)
+
+            ax.set_xlabel("Snack / Item", fontsize=12, fontweight='bold')
+            ax.set_ylabel("Number of Updates", fontsize=12, fontweight='bold')
+            ax.set_title("Snack Popularity Dashboard - Most Updated Items", fontsize=14, fontweight='bold', pad=20)
+            ax.tick_params(axis='x', labelrotation=45)
+            for label in ax.get_xticklabels():
+                label.set_horizontalalignment('right')
+            ax.grid(axis='y', alpha=0.3, linestyle='--')
+        else:
+            # Placeholder chart
+            fig = _figure((10, 6))
+            ax = fig.add_subplot()
+            ax.text(0.5, 0.5, 'No Data Available\n\nSubmit vendor updates to generate chart',
+                    ha='center', va='center', fontsize=16, transform=ax.transAxes)
+            ax.axis('off')
+
+        fig.tight_layout()
+        fig.savefig(buffer if out is None else out, format=fmt, dpi=dpi, bbox_inches='tight')
+        fig.clear()
+
+    if buffer is not None:
+        return buffer.getvalue()
+    return out
+
+
+def render_popularity_chart(conn, limit=10, out_path=CHART_PATH, dpi=150, fmt="png"):
+    """
+    Query the top `limit` items and render them.
+    Writes to out_path (returns the path) or, with out_path=None, returns
+    the image bytes.
+    """
+    data = fetch_popularity(conn, limit)
+    if out_path is None:
+        return draw_popularity(data, dpi=dpi, fmt=fmt)
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    # Write to a temp file and swap it in, so readers never see a partial PNG
+    tmp_path = f"{out_path}.tmp"
+    draw_popularity(data, out=tmp_path, dpi=dpi, fmt=fmt)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def main():
+    try:
+        with get_pool(DB).connection() as conn:
+            data = fetch_popularity(conn)
+        os.makedirs(os.path.dirname(CHART_PATH), exist_ok=True)
+        draw_popularity(data, out=CHART_PATH)
+
+        if data:
+            print(f"✅ Snack popularity chart generated successfully: {CHART_PATH}")
+            print(f"📊 Total items in chart: {len(data)}")
+        else:
+            print("⚠️  No vendor update data available for chart generation.")
+            print("📝 Ask vendors to submit updates to generate analytics.")
+            print("📋 Placeholder chart created.")
+
+    except Exception as e:
+        print(f"❌ Error generating chart: {e}")
+        import traceback
+        traceback.print_exc()
+
 
-# Ensure charts directory exists
-os.makedirs("static/charts", exist_ok=True)
-
-try:
-    conn = sqlite3.connect(DB)
-    c = conn.cursor()
-
-    c.execute("""
-        SELECT info, COUNT(*) as cnt
-        FROM updates
-        GROUP BY info
-        ORDER BY cnt DESC
-        LIMIT 10
-    """)
-
-    data = c.fetchall()
-    conn.close()
-
-    if data and len(data) > 0:
-        snacks = [row[0] for row in data]
-        counts = [row[1] for row in data]
-
-        # Create figure with better size
-        plt.figure(figsize=(12, 7))
-        
-        # Create bar chart with colors
-        colors = plt.cm.viridis([i/len(snacks) for i in range(len(snacks))])
-        bars = plt.bar(snacks, counts, color=colors, edgecolor='black', linewidth=1.2)
-        
-        # Add value labels on top of bars
-        for bar in bars:
-            height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height,
-                    f'{int(height)}',
-                    ha='center', va='bottom', fontweight='bold', fontsize=10)
-        
-        plt.xlabel("Snack / Item", fontsize=12, fontweight='bold')
-        plt.ylabel("Number of Updates", fontsize=12, fontweight='bold')
-        plt.title("Snack Popularity Dashboard - Most Updated Items", fontsize=14, fontweight='bold', pad=20)
-        plt.xticks(rotation=45, ha='right')
-        plt.grid(axis='y', alpha=0.3, linestyle='--')
-        plt.tight_layout()
-
-        # Save the chart
-        chart_path = "static/charts/popularity.png"
-        plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-        plt.close()
-
-        print(f"✅ Snack popularity chart generated successfully: {chart_path}")
-        print(f"📊 Total items in chart: {len(data)}")
-
-    else:
-        print("⚠️  No vendor update data available for chart generation.")
-        print("📝 Ask vendors to submit updates to generate analytics.")
-        
-        # Create a placeholder chart
-        plt.figure(figsize=(10, 6))
-        plt.text(0.5, 0.5, 'No Data Available\n\nSubmit vendor updates to generate chart', 
-                ha='center', va='center', fontsize=16, transform=plt.gca().transAxes)
-        plt.axis('off')
-        plt.tight_layout()
-        plt.savefig("static/charts/popularity.png", dpi=150, bbox_inches='tight')
-        plt.close()
-        print("📋 Placeholder chart created.")
-
-except Exception as e:
-    print(f"❌ Error generating chart: {e}")
-    import traceback
-    traceback.print_exc()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""
+Synthetic fleet data generator
+Fills the database with a production-shaped fleet: thousands of machines
+clustered around a few sites, tens of thousands of SKUs with per-category
+price and shelf-life distributions, machine inventory skewed towards
+popular snacks, and millions of vendor updates over a year with weekday
+and time-of-day patterns.
+
+Everything is drawn with NumPy from one seed, so the same seed and end
+date always give the same data. Rows are bulk-inserted in one
+transaction; the triggers and indexes on updates and update_items are
+suspended meanwhile, then the indexes, rollups and search index are
+rebuilt at the end.
+Generated rows are added to whatever is already in the database.
+
+Usage:
+    python generate_data.py --machines 2000 --snacks 20000 --updates 1000000
+    python generate_data.py --seed 7 --end 2026-06-30 --db fleet.db
+"""
+
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import rollups
+import update_search
+from db_pool import connect, DB
+from migrations import migrate
+
+# Bump whenever the same seed would generate different data, so seeded
+# databases cached by benchmark.py are rebuilt
+GENERATOR_VERSION = 2
+INSERT_BATCH = 50_000
+SLOTS_PER_MACHINE = 24
+HISTORY_DAYS = 365
+
+BRANDS = (
+    "Acme", "Crunchy Co", "Golden Farms", "Happy Bites", "Nature's Way", "Snackwell", "Sunny Valley",
+    "Big Munch", "Urban Oven", "Peak", "Blue Ridge", "Tasty Town", "Maple Lane", "Orchard",
+    "Red Barn", "Silver Spoon", "Green Leaf", "Cosmic", "Northern", "Coastal", "Harvest Moon",
+    "Little Chef", "Prairie", "Evergreen", "Sweet Tooth", "Old Mill", "Rocket", "Summit",
+    "Wild Oats", "Bright Day",
+)
+FLAVOURS = (
+    "Original", "Classic", "Salted", "Spicy", "BBQ", "Sour Cream", "Honey", "Caramel",
+    "Dark", "Lemon", "Berry", "Chili Lime",
+)
+# product -> category
+PRODUCTS = {
+    "Chips": "Savory", "Pretzels": "Savory", "Popcorn": "Savory", "Crackers": "Savory",
+    "Nuts": "Savory", "Tortilla Chips": "Savory", "Cheese Puffs": "Savory",
+    "Chocolate Bar": "Candy", "Gummy Bears": "Candy", "Toffee": "Candy", "Mints": "Candy",
+    "Licorice": "Candy", "Jelly Beans": "Candy",
+    "Cookies": "Bakery", "Muffin": "Bakery", "Brownie": "Bakery", "Croissant": "Bakery",
+    "Wafers": "Bakery", "Cake Bar": "Bakery",
+    "Granola Bar": "Healthy", "Trail Mix": "Healthy", "Protein Bar": "Healthy",
+    "Rice Cakes": "Healthy", "Dried Fruit": "Healthy",
+    "Cola": "Drinks", "Iced Tea": "Drinks", "Sparkling Water": "Drinks", "Juice": "Drinks",
+    "Energy Drink": "Drinks", "Cold Brew": "Drinks",
+}
+SIZES = ("Mini", "Regular", "Large", "Share Size", "Family")
+# category -> (median price, shelf life in days)
+CATEGORY_PROFILES = {
+    "Savory": (1.6, 120),
+    "Candy": (1.4, 270),
+    "Bakery": (2.2, 21),
+    "Healthy": (2.4, 150),
+    "Drinks": (1.9, 240),
+}
+
+SITES = (  # name, latitude, longitude
+    ("Central Campus", 28.6139, 77.2090),
+    ("North Park", 28.7041, 77.1025),
+    ("Tech Hub", 28.5355, 77.3910),
+    ("Airport Plaza", 28.5562, 77.1000),
+    ("Riverside", 28.6692, 77.4538),
+    ("Old Town", 28.6562, 77.2410),
+)
+AREAS = ("Lobby", "Cafeteria", "Break Room", "Gym", "Library", "Parking", "Reception", "Lounge")
+
+# Share of updates in each hour of the day: quiet overnight, peaks
+# mid-morning and mid-afternoon when vendors do their rounds
+HOURLY = np.array([
+    0.2, 0.1, 0.1, 0.1, 0.2, 0.6, 1.5, 3.5, 6.0, 8.5, 9.0, 8.0,
+    6.5, 7.0, 8.5, 8.8, 7.5, 5.5, 3.5, 2.2, 1.4, 0.9, 0.5, 0.3,
+])
+HOURLY = HOURLY / HOURLY.sum()
+# Monday..Sunday
+WEEKDAYS = np.array([1.1, 1.05, 1.05, 1.05, 1.0, 0.55, 0.4])
+
+UPDATE_TYPES = np.array(["restock", "maintenance", "issue"])
+UPDATE_TYPE_SHARE = (0.85, 0.10, 0.05)
+MAINTENANCE_NOTES = (
+    "Cleaned glass and coin mechanism", "Routine maintenance check", "Replaced card reader",
+    "Reset payment terminal", "Recalibrated cooling unit", "Replaced lighting strip",
+    "Tightened spiral motors", "Updated price labels",
+)
+ISSUE_NOTES = (
+    "Coin slot jammed", "Card reader offline", "Cooling unit running warm",
+    "Display not working", "Bill acceptor rejecting notes", "Door lock sticking",
+    "Spiral stuck on {snack}", "{snack} sold out early",
+)
+
+
+@contextmanager
+def suspended_triggers_and_indexes(conn, tables):
+    """
+    Drop the triggers and secondary indexes on `tables` for the duration,
+    then recreate them as they were. Building an index once over sorted
+    data is far cheaper than updating it row by row.
+    """
+    saved = conn.execute(f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('trigger', 'index') AND sql IS NOT NULL
+          AND tbl_name IN ({", ".join("?" * len(tables))})
+    """, tables).fetchall()
+    for kind, name, _ in saved:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    yield
+    for _, _, sql in saved:
+        conn.execute(sql)
+
+
+def _insert(conn, sql, columns):
+    """executemany over parallel column arrays, in INSERT_BATCH slices."""
+    rows = len(columns[0])
+    for start in range(0, rows, INSERT_BATCH):
+        conn.executemany(sql, zip(*(
+            column[start:start + INSERT_BATCH].tolist() if isinstance(column, np.ndarray)
+            else column[start:start + INSERT_BATCH]
+            for column in columns
+        )))
+
+
+def _next_id(conn, table):
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}").fetchone()[0]
+
+
+def _iso_days(base, offsets):
+    """YYYY-MM-DD strings for base (date) plus integer day offsets."""
+    return np.datetime_as_string(np.datetime64(base, "D") + offsets.astype("timedelta64[D]"))
+
+
+def make_snacks(rng, count, today):
+    """
+    Unique brand/flavour/product/size names with price and expiry drawn
+    per category. Returns a dict of column arrays plus a popularity weight
+    per snack (Zipf-like, so a few SKUs dominate restocks).
+    """
+    products = list(PRODUCTS)
+    combinations = len(BRANDS) * len(FLAVOURS) * len(products) * len(SIZES)
+    if count > combinations:
+        raise ValueError(f"At most {combinations} distinct snacks can be generated")
+    picks = rng.choice(combinations, size=count, replace=False)
+    picks, size = np.divmod(picks, len(SIZES))
+    picks, product = np.divmod(picks, len(products))
+    brand, flavour = np.divmod(picks, len(FLAVOURS))
+    names = [
+        f"{BRANDS[b]} {FLAVOURS[f]} {products[p]} {SIZES[s]}"
+        for b, f, p, s in zip(brand.tolist(), flavour.tolist(), product.tolist(), size.tolist())
+    ]
+
+    categories = np.array([PRODUCTS[p] for p in products])[product]
+    median_price = np.array([CATEGORY_PROFILES[c][0] for c in categories])
+    shelf_life = np.array([CATEGORY_PROFILES[c][1] for c in categories])
+    price = np.round(median_price * rng.lognormal(0.0, 0.25, count) * (1 + 0.3 * size / len(SIZES)), 2)
+    # Somewhere along each SKU's shelf life; a few percent already expired
+    days_left = np.floor(shelf_life * rng.uniform(-0.05, 1.0, count)).astype(np.int64)
+    popularity = 1.0 / rng.permutation(np.arange(1, count + 1)) ** 1.1
+
+    return {
+        "name": names,
+        "stock": rng.negative_binomial(3, 0.05, count),
+        "expiry_date": _iso_days(today, days_left),
+        "price": price,
+        "category": categories,
+        "popularity": popularity / popularity.sum(),
+    }
+
+
+def make_machines(rng, count, first_id):
+    """Machines clustered around SITES, with per-machine traffic weights."""
+    site = rng.integers(0, len(SITES), count)
+    area = rng.integers(0, len(AREAS), count)
+    building = rng.integers(1, 40, count)
+    floor = rng.integers(1, 12, count)
+    ids = np.arange(first_id, first_id + count)
+    site_names = [s[0] for s in SITES]
+    names = [f"{site_names[s]} {AREAS[a]} {i}" for s, a, i in zip(site.tolist(), area.tolist(), ids.tolist())]
+    locations = [f"{site_names[s]} - Building {b} - Floor {f}"
+                 for s, b, f in zip(site.tolist(), building.tolist(), floor.tolist())]
+    centre = np.array([(s[1], s[2]) for s in SITES])[site]
+    traffic = rng.lognormal(0.0, 0.6, count)
+
+    return {
+        "id": ids,
+        "name": names,
+        "location": locations,
+        "status": rng.choice(["active", "maintenance", "inactive"], size=count, p=(0.94, 0.04, 0.02)),
+        "latitude": np.round(centre[:, 0] + rng.normal(0, 0.01, count), 6),
+        "longitude": np.round(centre[:, 1] + rng.normal(0, 0.01, count), 6),
+        "traffic": traffic / traffic.sum(),
+    }
+
+
+def make_inventory(rng, machine_ids, snack_ids, popularity, slots):
+    """
+    Up to `slots` distinct snacks per machine, drawn by popularity.
+    Returns (machine, snack, qty) arrays sorted by machine.
+    """
+    machine = np.repeat(machine_ids, slots)
+    snack = snack_ids[rng.choice(len(snack_ids), size=len(machine), p=popularity)]
+    # Duplicate draws collapse, so busy machines of popular SKUs get a few fewer slots
+    keys = np.unique(machine * (int(snack_ids.max()) + 1) + snack)
+    machine, snack = np.divmod(keys, int(snack_ids.max()) + 1)
+    return machine, snack, rng.integers(0, 41, len(machine))
+
+
+def make_update_times(rng, count, end, days):
+    """`count` timestamps over the `days` before end, weighted by weekday and hour."""
+    first = np.datetime64(end - timedelta(days=days - 1), "D")
+    weekday = (np.arange(days) + (end - timedelta(days=days - 1)).weekday()) % 7
+    day_weight = WEEKDAYS[weekday] / WEEKDAYS[weekday].sum()
+    day = rng.choice(days, size=count, p=day_weight)
+    hour = rng.choice(24, size=count, p=HOURLY)
+    second = rng.integers(0, 3600, count)
+    stamps = first + day.astype("timedelta64[D]") + (hour * 3600 + second).astype("timedelta64[s]")
+    return np.sort(stamps)
+
+
+def generate(conn, machines=2000, snacks=20000, updates=1_000_000, seed=42, end=None,
+             days=HISTORY_DAYS, slots=SLOTS_PER_MACHINE, vendors=None, progress=print):
+    """
+    Insert a synthetic fleet and its update history. Runs in one
+    transaction and commits. Returns the number of rows written per table.
+    """
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    vendors = vendors or max(1, machines // 50)
+    written = {}
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        started = time.perf_counter()
+        snack_rows = make_snacks(rng, snacks, end)
+        snack_ids = np.arange(_next_id(conn, "snacks"), _next_id(conn, "snacks") + snacks)
+        _insert(conn, """
+            INSERT INTO snacks (id, name, stock, expiry_date, price, category) VALUES (?, ?, ?, ?, ?, ?)
+        """, [snack_ids, snack_rows["name"], snack_rows["stock"], snack_rows["expiry_date"],
+              snack_rows["price"], snack_rows["category"]])
+        written["snacks"] = snacks
+
+        fleet = make_machines(rng, machines, _next_id(conn, "machines"))
+        _insert(conn, """
+            INSERT INTO machines (id, name, location, status, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?)
+        """, [fleet["id"], fleet["name"], fleet["location"], fleet["status"],
+              fleet["latitude"], fleet["longitude"]])
+        written["machines"] = machines
+
+        slot_machine, slot_snack, slot_qty = make_inventory(
+            rng, fleet["id"], snack_ids, snack_rows["popularity"], slots
+        )
+        stamp = datetime.combine(end, datetime.min.time()).isoformat(timespec="seconds")
+        _insert(conn, """
+            INSERT INTO machine_inventory (machine_id, snack_id, qty, updated_at) VALUES (?, ?, ?, ?)
+        """, [slot_machine, slot_snack, slot_qty, [stamp] * len(slot_machine)])
+        written["machine_inventory"] = len(slot_machine)
+        progress(f"   catalog and fleet: {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        times = np.datetime_as_string(make_update_times(rng, updates, end, days), unit="s")
+        machine_index = rng.choice(machines, size=updates, p=fleet["traffic"])
+        # Each machine has a regular vendor who makes most of its updates
+        regular = rng.integers(1, vendors + 1, machines)
+        vendor = np.where(rng.random(updates) < 0.9, regular[machine_index], rng.integers(1, vendors + 1, updates))
+        kind = rng.choice(len(UPDATE_TYPES), size=updates, p=UPDATE_TYPE_SHARE)
+
+        # Restocks name 1-4 of the machine's own slots; slots are grouped by
+        # machine, so a slot is its machine's offset plus a random index
+        slot_start = np.searchsorted(slot_machine, fleet["id"])
+        slot_count = np.diff(np.append(slot_start, len(slot_machine)))
+        item_count = np.where(kind == 0, rng.integers(1, 5, updates), 0)
+        item_update = np.repeat(np.arange(updates), item_count)
+        item_machine = machine_index[item_update]
+        item_slot = slot_start[item_machine] + (rng.random(len(item_update)) * slot_count[item_machine]).astype(np.int64)
+        item_snack = slot_snack[item_slot]
+        item_qty = rng.integers(1, 41, len(item_update))
+        # The same slot twice in one note is merged into one item
+        _, first = np.unique(item_update * (len(slot_machine) + 1) + item_slot, return_index=True)
+        item_update, item_snack, item_qty = item_update[first], item_snack[first], item_qty[first]
+
+        names = snack_rows["name"]
+        offset = snack_ids[0]
+        notes = [""] * updates
+        for update, snack_id, qty in zip(item_update.tolist(), item_snack.tolist(), item_qty.tolist()):
+            part = f"{names[snack_id - offset]} x{qty}"
+            notes[update] = f"{notes[update]}, {part}" if notes[update] else f"Restocked {part}"
+        other = np.flatnonzero(kind != 0)
+        pick = rng.integers(0, 1 << 30, len(other))
+        featured = slot_snack[slot_start[machine_index[other]] + pick % slot_count[machine_index[other]]]
+        for update, update_kind, choice, snack_id in zip(
+                other.tolist(), kind[other].tolist(), pick.tolist(), featured.tolist()):
+            pool = MAINTENANCE_NOTES if update_kind == 1 else ISSUE_NOTES
+            notes[update] = pool[choice % len(pool)].format(snack=names[snack_id - offset])
+
+        update_ids = np.arange(_next_id(conn, "updates"), _next_id(conn, "updates") + updates)
+        machine_ids = fleet["id"][machine_index]
+        machine_names = np.array(fleet["name"], dtype=object)[machine_index]
+        vendor_names = np.char.add("vendor", vendor.astype(str))
+        progress(f"   update history drawn: {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        with suspended_triggers_and_indexes(conn, ("updates", "update_items")):
+            _insert(conn, """
+                INSERT INTO updates (id, vendor, machine, machine_id, info, time, update_type)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [update_ids, vendor_names, machine_names, machine_ids, notes, times, UPDATE_TYPES[kind]])
+            # Items straight from the draws: the same rows index_updates()
+            # would parse back out of the notes
+            _insert(conn, """
+                INSERT INTO update_items (update_id, machine_id, snack_id, quantity, update_type, time)
+                VALUES (?, ?, ?, ?, 'restock', ?)
+            """, [update_ids[item_update], machine_ids[item_update], item_snack, item_qty, times[item_update]])
+        written["updates"] = updates
+        written["update_items"] = len(item_update)
+        progress(f"   updates inserted: {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        rollups.rebuild(conn)
+        update_search.rebuild(conn)
+        progress(f"   rollups and search index rebuilt: {time.perf_counter() - started:.1f}s")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.execute("ANALYZE")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic fleet and its update history")
+    parser.add_argument("--db", default=DB)
+    parser.add_argument("--machines", type=int, default=2000)
+    parser.add_argument("--snacks", type=int, default=20000)
+    parser.add_argument("--updates", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=HISTORY_DAYS, help="Days of update history")
+    parser.add_argument("--slots", type=int, default=SLOTS_PER_MACHINE, help="Snacks per machine")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end", help="Last day of history, YYYY-MM-DD (default today)")
+    args = parser.parse_args(argv)
+
+    try:
+        end = date.fromisoformat(args.end) if args.end else None
+    except ValueError:
+        print(f"❌ ERROR: --end must be a YYYY-MM-DD date, got {args.end!r}")
+        sys.exit(1)
+    if not os.path.exists(args.db):
+        print(f"❌ ERROR: Database '{args.db}' not found! Run database.py first.")
+        sys.exit(1)
+
+    migrate(args.db)
+    conn = connect(args.db)
+    # Generated data can always be regenerated, so skip fsyncs while
+    # loading, and give index builds a larger page cache
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")
+    started = time.perf_counter()
+    print(f"🏭 Generating {args.machines:,} machines, {args.snacks:,} snacks and "
+          f"{args.updates:,} updates (seed {args.seed})...")
+    try:
+        written = generate(conn, args.machines, args.snacks, args.updates, args.seed, end,
+                           args.days, args.slots)
+    except ValueError as e:
+        print(f"❌ ERROR: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    print(f"✅ Done in {time.perf_counter() - started:.1f}s")
+    for table, count in written.items():
+        print(f"   {table}: {count:,} row(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,250 @@
 """
 Enhanced QR Code Generator with detailed error handling
-Generates QR codes for all vending machines in the database
+Generates QR codes for vending machines, skipping codes that are already
+up to date (tracked by a payload hash per machine in the qr_codes table).
+
+    python generate_qr.py                 # missing or stale codes only
+    python generate_qr.py --force         # regenerate everything
+    python generate_qr.py --machine 4     # just one machine
+    python generate_qr.py --workers 8     # size of the process pool
+
+The URL in each code comes from Config.QR_BASE_URL (QR_BASE_URL env var);
+changing it marks every code stale. Printable sheets: see qr_sheets.py.
+
+From code:
+    from generate_qr import generate_machine_qr
+    generate_machine_qr(machine_id)
 """
 
-import qrcode
+import argparse
+import hashlib
+import io
 import os
-import sqlite3
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from config import Config
+from db_pool import get_pool
 
 DB = "database.db"
 QR_DIR = "static/qrcodes"
+BASE_URL = Config.QR_BASE_URL.rstrip("/")
+
+# Render settings; part of the payload hash so changing them marks codes stale
+QR_SETTINGS = {"version": 1, "error_correction": "L", "box_size": 10, "border": 4}
+QR_MIMETYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+# Below this many codes a process pool costs more than it saves
+PARALLEL_THRESHOLD = 16
+
+
+def machine_url(machine_id):
+    return f"{BASE_URL}/machine_view/{machine_id}"
 
-print("\n" + "="*70)
-print("  QR CODE GENERATOR")
-print("="*70 + "\n")
 
-# Step 1: Check if qrcode library is installed
-try:
+def qr_path(machine_id):
+    return os.path.join(QR_DIR, f"machine_{machine_id}.png")
+
+
+def payload_hash(payload):
+    settings = ",".join(f"{k}={v}" for k, v in sorted(QR_SETTINGS.items()))
+    return hashlib.sha256(f"{payload}|{settings}".encode("utf-8")).hexdigest()[:16]
+
+
+def make_qr_image(payload, image_factory=None):
     import qrcode
-    from PIL import Image
-    print("✅ QR code libraries installed")
-except ImportError as e:
-    print("❌ ERROR: Required libraries not installed!")
-    print("\n🔧 Solution: Install required packages:")
-    print("   pip install qrcode[pil]")
-    print("   pip install Pillow")
-    sys.exit(1)
-
-# Step 2: Create QR codes directory
-try:
+
+    qr = qrcode.QRCode(
+        image_factory=image_factory,
+        version=QR_SETTINGS["version"],
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=QR_SETTINGS["box_size"],
+        border=QR_SETTINGS["border"],
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white")
+
+
+def render_qr_bytes(payload, fmt="png"):
+    """Render a QR code in memory as PNG or SVG bytes."""
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        from qrcode.image.svg import SvgPathImage
+        make_qr_image(payload, image_factory=SvgPathImage).save(buffer)
+    elif fmt == "png":
+        make_qr_image(payload).save(buffer)
+    else:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    return buffer.getvalue()
+
+
+def render_qr_file(machine_id):
+    """Render and save one machine's code. Returns (machine_id, hash, path).
+    Module-level so it can run in a worker process."""
+    payload = machine_url(machine_id)
+    path = qr_path(machine_id)
     os.makedirs(QR_DIR, exist_ok=True)
-    print(f"✅ Directory created/verified: {QR_DIR}")
-except Exception as e:
-    print(f"❌ ERROR: Cannot create directory: {e}")
-    sys.exit(1)
+    make_qr_image(payload).save(path)
+    return machine_id, payload_hash(payload), path
 
-# Step 3: Connect to database
-try:
+
+def stale_machine_ids(conn, machine_ids=None, force=False):
+    """Machines whose code is missing on disk or was made from another payload."""
+    if machine_ids is None:
+        machine_ids = [row[0] for row in conn.execute("SELECT id FROM machines ORDER BY id")]
+        if force:
+            return machine_ids
+        recorded = dict(conn.execute("SELECT machine_id, payload_hash FROM qr_codes"))
+    else:
+        machine_ids = list(machine_ids)
+        if force:
+            return machine_ids
+        placeholders = ",".join("?" * len(machine_ids))
+        recorded = dict(conn.execute(
+            f"SELECT machine_id, payload_hash FROM qr_codes WHERE machine_id IN ({placeholders})",
+            machine_ids
+        ))
+    return [
+        machine_id for machine_id in machine_ids
+        if recorded.get(machine_id) != payload_hash(machine_url(machine_id))
+        or not os.path.exists(qr_path(machine_id))
+    ]
+
+
+def record_generated(conn, results):
+    now = datetime.now().isoformat(timespec="seconds")
+    conn.executemany("""
+        INSERT INTO qr_codes (machine_id, payload_hash, path, generated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(machine_id) DO UPDATE SET
+            payload_hash=excluded.payload_hash,
+            path=excluded.path,
+            generated_at=excluded.generated_at
+    """, [(machine_id, digest, path, now) for machine_id, digest, path in results])
+    conn.commit()
+
+
+def persist_qr_png(machine_id, png):
+    """Save already-rendered PNG bytes as the machine's code file and record it."""
+    path = qr_path(machine_id)
+    os.makedirs(QR_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(png)
+    os.replace(tmp_path, path)
+    with get_pool(DB).connection() as conn:
+        record_generated(conn, [(machine_id, payload_hash(machine_url(machine_id)), path)])
+    return path
+
+
+def generate_machine_qr(machine_id, force=False):
+    """
+    Make sure one machine's QR code exists and is current.
+    Returns (path, generated) where generated is False if it was up to date.
+    """
+    with get_pool(DB).connection() as conn:
+        if not stale_machine_ids(conn, [machine_id], force=force):
+            return qr_path(machine_id), False
+        result = render_qr_file(machine_id)
+        record_generated(conn, [result])
+    return result[2], True
+
+
+def generate_missing_qr(machine_ids=None, force=False, workers=None):
+    """
+    Generate every missing or stale code, fanning out over a process pool
+    for large batches. Returns (generated, failed) lists of machine ids.
+    """
+    with get_pool(DB).connection() as conn:
+        pending = stale_machine_ids(conn, machine_ids, force=force)
+
+    results, failed = [], []
+    if len(pending) < PARALLEL_THRESHOLD or workers == 1:
+        for machine_id in pending:
+            try:
+                results.append(render_qr_file(machine_id))
+            except Exception as e:
+                print(f"❌ FAILED - Machine {machine_id}: {e}")
+                failed.append(machine_id)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {machine_id: executor.submit(render_qr_file, machine_id) for machine_id in pending}
+            for machine_id, future in futures.items():
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"❌ FAILED - Machine {machine_id}: {e}")
+                    failed.append(machine_id)
+
+    if results:
+        with get_pool(DB).connection() as conn:
+            record_generated(conn, results)
+    return [r[0] for r in results], failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate QR codes for vending machines")
+    parser.add_argument("--force", action="store_true", help="regenerate codes that are already up to date")
+    parser.add_argument("--machine", type=int, action="append", help="only this machine id (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    print("\n" + "="*70)
+    print("  QR CODE GENERATOR")
+    print("="*70 + "\n")
+
+    # Step 1: Check if qrcode library is installed
+    try:
+        import qrcode
+        from PIL import Image
+        print("✅ QR code libraries installed")
+    except ImportError:
+        print("❌ ERROR: Required libraries not installed!")
+        print("\n🔧 Solution: Install required packages:")
+        print("   pip install qrcode[pil]")
+        print("   pip install Pillow")
+        sys.exit(1)
+
+    # Step 2: Check database
     if not os.path.exists(DB):
         print(f"❌ ERROR: Database '{DB}' not found!")
         print("\n🔧 Solution: Run 'python database.py' to create database")
         sys.exit(1)
-    
-    conn = sqlite3.connect(DB)
-    cursor = conn.cursor()
-    print(f"✅ Connected to database: {DB}")
-except Exception as e:
-    print(f"❌ ERROR: Cannot connect to database: {e}")
-    sys.exit(1)
-
-# Step 4: Get all machines
-try:
-    cursor.execute("SELECT id, name, location FROM machines")
-    machines = cursor.fetchall()
-    
-    if not machines:
+
+    with get_pool(DB).connection() as conn:
+        total = conn.execute("SELECT COUNT(*) FROM machines").fetchone()[0]
+    if not total:
         print("\n⚠️  WARNING: No machines found in database!")
         print("\n🔧 Solution: Add machines via admin panel or run:")
         print("   python database.py")
-        conn.close()
         sys.exit(0)
-    
-    print(f"✅ Found {len(machines)} machine(s) in database\n")
-    
-except Exception as e:
-    print(f"❌ ERROR: Cannot query machines: {e}")
-    conn.close()
-    sys.exit(1)
-
-# Step 5: Generate QR codes
-print("="*70)
-print("  GENERATING QR CODES")
-print("="*70 + "\n")
-
-success_count = 0
-failed_count = 0
-
-for machine_id, machine_name, location in machines:
+    print(f"✅ Found {total} machine(s) in database\n")
+
+    # Step 3: Generate missing / stale QR codes
+    print("="*70)
+    print("  GENERATING QR CODES")
+    print("="*70 + "\n")
+
     try:
-        # Create URL for machine
-        url = f"http://127.0.0.1:5000/machine_view/{machine_id}"
-        
-        # Generate QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(url)
-        qr.make(fit=True)
-        
-        # Create image
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Save QR code
-        qr_path = os.path.join(QR_DIR, f"machine_{machine_id}.png")
-        img.save(qr_path)
-        
-        print(f"✅ Machine {machine_id}: {machine_name}")
-        print(f"   Location: {location}")
-        print(f"   QR Code: {qr_path}")
-        print(f"   URL: {url}\n")
-        
-        success_count += 1
-        
+        generated, failed = generate_missing_qr(args.machine, force=args.force, workers=args.workers)
     except Exception as e:
-        print(f"❌ FAILED - Machine {machine_id}: {machine_name}")
-        print(f"   Error: {e}\n")
-        failed_count += 1
-
-conn.close()
-
-# Step 6: Summary
-print("="*70)
-print("  GENERATION COMPLETE")
-print("="*70 + "\n")
-
-print(f"✅ Successfully generated: {success_count} QR code(s)")
-if failed_count > 0:
-    print(f"❌ Failed: {failed_count} QR code(s)")
-
-print("\n📱 QR codes saved in: " + os.path.abspath(QR_DIR))
-print("\n🔍 To view QR codes:")
-print("   1. Start your app: python app.py")
-print("   2. Login and go to: http://127.0.0.1:5000/qr_access")
-print("   3. Or check the 'static/qrcodes/' folder directly")
-
-print("\n" + "="*70 + "\n")
-
-# Verify files exist
-print("Verifying generated files:")
-for machine_id, machine_name, _ in machines:
-    qr_path = os.path.join(QR_DIR, f"machine_{machine_id}.png")
-    if os.path.exists(qr_path):
-        file_size = os.path.getsize(qr_path)
-        print(f"  ✅ machine_{machine_id}.png ({file_size} bytes)")
-    else:
-        print(f"  ❌ machine_{machine_id}.png (NOT FOUND)")
+        print(f"❌ ERROR: Cannot generate QR codes: {e}")
+        sys.exit(1)
+
+    print(f"✅ Successfully generated: {len(generated)} QR code(s)")
+    print(f"⏭️  Already up to date: {(len(args.machine) if args.machine else total) - len(generated) - len(failed)}")
+    if failed:
+        print(f"❌ Failed: {len(failed)} QR code(s): {failed}")
+
+    print("\n📱 QR codes saved in: " + os.path.abspath(QR_DIR))
+    print("\n🔍 To view QR codes:")
+    print("   1. Start your app: python app.py")
+    print(f"   2. Login and go to: {BASE_URL}/qr_access")
+    print("   3. Or check the 'static/qrcodes/' folder directly")
+    print("\n" + "="*70 + "\n")
+
 
-print("\n" + "="*70 + "\n")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
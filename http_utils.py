@@ -0,0 +1,76 @@
+"""
+HTTP response helpers
+Cursor encoding, ETag-based conditional responses and gzip/brotli
+compression for API responses. Brotli is used only if the optional
+`brotli` package is installed.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/html", "image/svg+xml"}
+MIN_COMPRESS_SIZE = 1024
+
+
+def encode_cursor(data):
+    """Opaque, URL-safe cursor for keyset pagination."""
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on a malformed cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def conditional_json(app, request, payload, headers=None):
+    """
+    JSON response with a weak ETag over the body. Returns 304 when the
+    client's If-None-Match matches. Weak, so it survives compression.
+    """
+    body = json.dumps(payload, separators=(",", ":"))
+    response = app.response_class(body, mimetype="application/json", headers=headers)
+    response.set_etag(hashlib.sha256(body.encode("utf-8")).hexdigest()[:32], weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def compress_response(request, response):
+    """
+    Compress eligible responses with br or gzip, per Accept-Encoding.
+    Streamed and passthrough (file) responses are left alone.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        data, encoding = brotli.compress(data, quality=5), "br"
+    elif accepted["gzip"]:
+        data, encoding = gzip.compress(data, compresslevel=6), "gzip"
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,254 @@
+"""
+Request and query metrics
+Latency histograms per route and per normalized SQL statement, row and
+call counts, queries-per-request (to spot N+1 loops) and a log of slow
+queries with their EXPLAIN QUERY PLAN. Everything is in memory, per
+process; app.py feeds it from request hooks and the db_pool statement
+hook and serves it at /metrics (Prometheus text format) and /admin/debug.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from functools import lru_cache
+
+# Upper bounds in seconds, Prometheus-style (le)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+SLOW_LOG_SIZE = 50
+# The same statement this many times in one request looks like a loop
+N_PLUS_ONE_REPEATS = 10
+PREFIX = "vmt"
+# ConnectionPool.stats() keys that are levels; the rest only grow
+POOL_GAUGES = {"max_connections", "open", "idle", "in_use"}
+
+STRINGS = re.compile(r"'(?:[^']|'')*'")
+NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """One line per statement shape: literals become ?, IN lists collapse."""
+    sql = STRINGS.sub("?", sql)
+    sql = NUMBERS.sub("?", sql)
+    sql = IN_LISTS.sub("(?, ...)", sql)
+    return SPACES.sub(" ", sql).strip()
+
+
+def explain(conn, sql, args=()):
+    """EXPLAIN QUERY PLAN for a SELECT as indented lines; [] for writes."""
+    if not sql.lstrip().lower().startswith(("select", "with")):
+        return []
+    try:
+        # A plain cursor, so the plan lookup isn't itself profiled
+        rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, args).fetchall()
+    except Exception as e:
+        return [f"(could not explain: {e})"]
+    depth, lines = {0: -1}, []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return lines
+
+
+class Histogram:
+    """Counts per bucket (plus +Inf), with the sum and count of observations."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile the way Prometheus' histogram_quantile()
+        does: linear interpolation inside the bucket it falls in.
+        """
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+    def cumulative(self):
+        """(le, cumulative count) pairs, ending with +Inf."""
+        total, pairs = 0, []
+        for bound, n in zip(self.buckets + ("+Inf",), self.counts):
+            total += n
+            pairs.append((bound, total))
+        return pairs
+
+
+class RequestStats:
+    """Per-request tally of the queries it ran."""
+
+    def __init__(self, endpoint, method):
+        self.endpoint = endpoint
+        self.method = method
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.query_seconds = 0.0
+
+
+class Metrics:
+    """Thread-safe store for everything above."""
+
+    def __init__(self, slow_query_seconds=0.1):
+        self.slow_query_seconds = slow_query_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.since = time.time()
+            self.requests = {}             # (endpoint, method) -> Histogram
+            self.statuses = Counter()      # (endpoint, method, status) -> count
+            self.queries_per_request = {}  # endpoint -> Histogram
+            self.queries = {}              # normalized sql -> dict
+            self.repeats = {}              # endpoint -> worst repeated statement
+            self.slow = deque(maxlen=SLOW_LOG_SIZE)
+
+    # ---------- recording ----------
+    def begin_request(self, endpoint, method):
+        return RequestStats(endpoint, method)
+
+    def end_request(self, stats, status):
+        seconds = time.perf_counter() - stats.started
+        key = (stats.endpoint, stats.method)
+        count = sum(stats.queries.values())
+        sql, repeats = stats.queries.most_common(1)[0] if stats.queries else (None, 0)
+        with self._lock:
+            self.requests.setdefault(key, Histogram()).observe(seconds)
+            self.statuses[key + (status,)] += 1
+            self.queries_per_request.setdefault(stats.endpoint, Histogram(QUERY_COUNT_BUCKETS)).observe(count)
+            worst = self.repeats.get(stats.endpoint)
+            if repeats >= N_PLUS_ONE_REPEATS and (worst is None or repeats > worst["repeats"]):
+                self.repeats[stats.endpoint] = {"endpoint": stats.endpoint, "sql": sql, "repeats": repeats}
+
+    def observe_query(self, stats, sql, seconds, rows, error=False):
+        """Record one statement; `stats` is the current RequestStats or None."""
+        sql = normalize_sql(sql)
+        if stats is not None:
+            stats.queries[sql] += 1
+            stats.query_seconds += seconds
+        with self._lock:
+            entry = self.queries.get(sql)
+            if entry is None:
+                entry = self.queries[sql] = {"histogram": Histogram(), "rows": 0, "errors": 0}
+            entry["histogram"].observe(seconds)
+            entry["rows"] += rows
+            entry["errors"] += bool(error)
+        return sql
+
+    def record_slow(self, stats, sql, seconds, rows, plan):
+        with self._lock:
+            self.slow.appendleft({
+                "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "endpoint": stats.endpoint if stats else None,
+                "sql": normalize_sql(sql),
+                "ms": round(seconds * 1000, 1),
+                "rows": rows,
+                "plan": plan,
+            })
+
+    # ---------- reading ----------
+    def snapshot(self):
+        """Summary rows for the debug page, slowest first."""
+        with self._lock:
+            routes = [{
+                "endpoint": endpoint,
+                "method": method,
+                "requests": h.count,
+                "avg_ms": h.sum / h.count * 1000,
+                "p50_ms": h.quantile(0.5) * 1000,
+                "p95_ms": h.quantile(0.95) * 1000,
+                "p99_ms": h.quantile(0.99) * 1000,
+                "avg_queries": self.queries_per_request[endpoint].sum / max(self.queries_per_request[endpoint].count, 1),
+                "errors": sum(n for (e, m, status), n in self.statuses.items()
+                              if (e, m) == (endpoint, method) and status >= 500),
+            } for (endpoint, method), h in self.requests.items()]
+            queries = [{
+                "sql": sql,
+                "calls": entry["histogram"].count,
+                "total_ms": entry["histogram"].sum * 1000,
+                "p95_ms": entry["histogram"].quantile(0.95) * 1000,
+                "avg_rows": entry["rows"] / entry["histogram"].count,
+                "errors": entry["errors"],
+            } for sql, entry in self.queries.items()]
+            return {
+                "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.since)),
+                "routes": sorted(routes, key=lambda r: -r["p95_ms"]),
+                "queries": sorted(queries, key=lambda q: -q["total_ms"]),
+                "repeats": sorted(self.repeats.values(), key=lambda r: -r["repeats"]),
+                "slow": list(self.slow),
+                "slow_query_ms": self.slow_query_seconds * 1000,
+            }
+
+    def prometheus(self, pool_stats=None):
+        """
+        All metrics in the Prometheus text exposition format, plus the
+        numbers from ConnectionPool.stats() if given.
+        """
+        lines = []
+        with self._lock:
+            _histogram(lines, f"{PREFIX}_http_request_duration_seconds",
+                       "Time to build a response, by route", ("endpoint", "method"), self.requests)
+            lines.append(f"# HELP {PREFIX}_http_requests_total Responses by route and status")
+            lines.append(f"# TYPE {PREFIX}_http_requests_total counter")
+            for (endpoint, method, status), n in sorted(self.statuses.items()):
+                lines.append(f"{PREFIX}_http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {n}")
+            _histogram(lines, f"{PREFIX}_http_request_queries",
+                       "SQL statements per request, by route", ("endpoint",),
+                       {(endpoint,): h for endpoint, h in self.queries_per_request.items()})
+            _histogram(lines, f"{PREFIX}_db_query_duration_seconds",
+                       "Time per normalized SQL statement", ("query",),
+                       {(sql,): entry["histogram"] for sql, entry in self.queries.items()})
+            lines.append(f"# HELP {PREFIX}_db_query_rows_total Rows returned per normalized statement")
+            lines.append(f"# TYPE {PREFIX}_db_query_rows_total counter")
+            for sql, entry in sorted(self.queries.items()):
+                lines.append(f"{PREFIX}_db_query_rows_total{_labels(query=sql)} {entry['rows']}")
+            lines.append(f"# HELP {PREFIX}_db_query_errors_total Failed statements per normalized statement")
+            lines.append(f"# TYPE {PREFIX}_db_query_errors_total counter")
+            for sql, entry in sorted(self.queries.items()):
+                lines.append(f"{PREFIX}_db_query_errors_total{_labels(query=sql)} {entry['errors']}")
+        for name, value in (pool_stats or {}).items():
+            if isinstance(value, (int, float)):
+                kind = "gauge" if name in POOL_GAUGES else "counter"
+                metric = f"{PREFIX}_db_pool_{name}" + ("_total" if kind == "counter" else "")
+                lines.append(f"# HELP {metric} Connection pool {name.replace('_', ' ')}")
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(**labels):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _histogram(lines, name, help_text, label_names, histograms):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for key, h in sorted(histograms.items()):
+        labels = dict(zip(label_names, key))
+        for bound, total in h.cumulative():
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {total}")
+        lines.append(f"{name}_sum{_labels(**labels)} {h.sum}")
+        lines.append(f"{name}_count{_labels(**labels)} {h.count}")
@@ -0,0 +1,552 @@
+"""
+Versioned schema migrations
+Each migration runs once, in version order, inside its own transaction.
+Applied versions are recorded in the schema_migrations table, so the schema
+can be evolved on a live database without rebuilding it.
+
+Run directly to apply pending migrations:
+    python migrations.py
+"""
+
+import re
+from datetime import datetime
+
+from db_pool import connect, DB
+from expiry import normalize_expiry_date
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a migration function. It receives an open connection
+    already inside a transaction and must not commit."""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+# ---------- MIGRATIONS ----------
+@migration(1, "Base schema: snacks, users, machines, updates")
+def _base_schema(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS snacks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        stock INTEGER DEFAULT 0,
+        expiry_date DATE NOT NULL,
+        price REAL DEFAULT 0.0,
+        category TEXT DEFAULT 'General',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT CHECK(role IN ('admin','vendor','employee')) NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS machines (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        location TEXT NOT NULL,
+        status TEXT DEFAULT 'active' CHECK(status IN ('active', 'maintenance', 'inactive')),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS updates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        vendor TEXT NOT NULL,
+        machine TEXT NOT NULL,
+        info TEXT NOT NULL,
+        time TEXT NOT NULL,
+        update_type TEXT DEFAULT 'restock' CHECK(update_type IN ('restock', 'maintenance', 'issue'))
+    )
+    """)
+
+
+@migration(2, "Normalize snacks.expiry_date and index it")
+def _normalize_expiry_dates(conn):
+    rows = conn.execute("""
+        SELECT id, expiry_date FROM snacks
+        WHERE expiry_date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+    """).fetchall()
+
+    fixed, unparsed = [], []
+    for snack_id, value in rows:
+        normalized = normalize_expiry_date(value)
+        if normalized:
+            fixed.append((normalized, snack_id))
+        else:
+            unparsed.append(snack_id)
+
+    conn.executemany("UPDATE snacks SET expiry_date=? WHERE id=?", fixed)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_snacks_expiry_date ON snacks(expiry_date)")
+
+    if fixed:
+        print(f"Normalized {len(fixed)} snack expiry date(s)")
+    if unparsed:
+        print(f"Could not parse expiry date for snack id(s): {unparsed}")
+
+
+@migration(3, "Indexes on updates for vendor history, time ordering and analytics")
+def _updates_indexes(conn):
+    # vendor_update: WHERE vendor=? ORDER BY time DESC LIMIT 10
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_vendor_time ON updates(vendor, time)")
+    # view_updates / analytics: ORDER BY time DESC LIMIT n
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_time ON updates(time)")
+    # analytics GROUP BY machine / info: covering index scans
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_machine ON updates(machine)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_info ON updates(info)")
+
+
+@migration(4, "Track generated QR codes by payload hash")
+def _qr_codes(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS qr_codes (
+        machine_id INTEGER PRIMARY KEY,
+        payload_hash TEXT NOT NULL,
+        path TEXT NOT NULL,
+        generated_at TEXT NOT NULL
+    )
+    """)
+
+
+@migration(5, "Indexes for /api/snacks filters")
+def _snacks_api_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_snacks_category ON snacks(category, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_snacks_stock ON snacks(stock)")
+
+
+# Columns mirrored into the change log for each tracked table
+CHANGE_LOG_TABLES = {
+    "snacks": ("snack", ("id", "name", "stock", "expiry_date", "price", "category")),
+    "machines": ("machine", ("id", "name", "location", "status")),
+}
+
+
+def create_change_triggers(conn, table, columns=None):
+    """AFTER INSERT/UPDATE/DELETE triggers on `table` that append to changes."""
+    entity, default_columns = CHANGE_LOG_TABLES[table]
+    columns = columns or default_columns
+    new_json = "json_object(" + ", ".join(f"'{c}', NEW.{c}" for c in columns) + ")"
+    changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in columns)
+
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table}
+    BEGIN
+        INSERT INTO changes (entity, entity_id, op, data) VALUES ('{entity}', NEW.id, 'insert', {new_json});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_changes_update AFTER UPDATE ON {table}
+    WHEN {changed}
+    BEGIN
+        INSERT INTO changes (entity, entity_id, op, data) VALUES ('{entity}', NEW.id, 'update', {new_json});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table}
+    BEGIN
+        INSERT INTO changes (entity, entity_id, op, data) VALUES ('{entity}', OLD.id, 'delete', NULL);
+    END
+    """)
+
+
+@migration(6, "Change log for snacks and machines, kept by triggers")
+def _change_log(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS changes (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        entity_id INTEGER NOT NULL,
+        op TEXT NOT NULL CHECK(op IN ('insert', 'update', 'delete')),
+        data TEXT,
+        changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now'))
+    )
+    """)
+    for table in CHANGE_LOG_TABLES:
+        create_change_triggers(conn, table)
+
+    # Log the rows that already exist as inserts, so a client reading from
+    # since=0 gets the whole catalog and not just what changed after today
+    for table, (entity, columns) in CHANGE_LOG_TABLES.items():
+        data = "json_object(" + ", ".join(f"'{c}', {c}" for c in columns) + ")"
+        conn.execute(f"""
+        INSERT INTO changes (entity, entity_id, op, data)
+        SELECT '{entity}', id, 'insert', {data}
+        FROM {table}
+        WHERE id NOT IN (SELECT entity_id FROM changes WHERE entity = '{entity}')
+        ORDER BY id
+        """)
+
+
+@migration(7, "Per-machine inventory")
+def _machine_inventory(conn):
+    # Clustered on (machine_id, snack_id): a machine page is one range scan
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS machine_inventory (
+        machine_id INTEGER NOT NULL,
+        snack_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL DEFAULT 0 CHECK(qty >= 0),
+        updated_at TEXT,
+        PRIMARY KEY (machine_id, snack_id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_machine_inventory_snack ON machine_inventory(snack_id)")
+
+    # Existing machines showed the global catalog until now; start them
+    # from the same numbers so their pages don't go blank
+    conn.execute("""
+    INSERT OR IGNORE INTO machine_inventory (machine_id, snack_id, qty, updated_at)
+    SELECT m.id, s.id, MAX(s.stock, 0), strftime('%Y-%m-%dT%H:%M:%S', 'now')
+    FROM machines m CROSS JOIN snacks s
+    """)
+
+
+def _rollup_bump(row, sign, columns):
+    """
+    Trigger statements adding `sign` to every rollup bucket of OLD/NEW.
+    columns maps each rollup dimension to the row's column holding it;
+    NULL values aren't counted.
+    """
+    statements = []
+    for dimension, column in columns.items():
+        value, day = f"{row}.{column}", f"substr({row}.time, 1, 10)"
+        if sign > 0:
+            statements.append(f"""
+        INSERT INTO update_counts (dimension, value, count) SELECT '{dimension}', {value}, 1 WHERE {value} IS NOT NULL
+            ON CONFLICT(dimension, value) DO UPDATE SET count = count + 1;
+        INSERT INTO update_daily (dimension, day, value, count) SELECT '{dimension}', {day}, {value}, 1 WHERE {value} IS NOT NULL
+            ON CONFLICT(dimension, day, value) DO UPDATE SET count = count + 1;""")
+        else:
+            statements.append(f"""
+        UPDATE update_counts SET count = count - 1 WHERE dimension = '{dimension}' AND value = {value};
+        DELETE FROM update_counts WHERE dimension = '{dimension}' AND value = {value} AND count <= 0;
+        UPDATE update_daily SET count = count - 1 WHERE dimension = '{dimension}' AND day = {day} AND value = {value};
+        DELETE FROM update_daily WHERE dimension = '{dimension}' AND day = {day} AND value = {value} AND count <= 0;""")
+    return "".join(statements)
+
+
+def create_rollup_triggers(conn, table, columns):
+    """Insert/delete/update triggers on `table` keeping the rollups current."""
+    for op in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {table}_rollup_{op}")
+    watched = ", ".join(sorted(set(columns.values()) | {"time"}))
+    conn.execute(f"""
+    CREATE TRIGGER {table}_rollup_insert AFTER INSERT ON {table}
+    BEGIN{_rollup_bump("NEW", 1, columns)}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER {table}_rollup_delete AFTER DELETE ON {table}
+    BEGIN{_rollup_bump("OLD", -1, columns)}
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER {table}_rollup_update AFTER UPDATE OF {watched} ON {table}
+    BEGIN{_rollup_bump("OLD", -1, columns)}{_rollup_bump("NEW", 1, columns)}
+    END
+    """)
+
+
+def _v8_rebuild(conn, dimensions):
+    """
+    Recompute the rollups for {dimension: (table, column)} as
+    rollups.rebuild() did at migration 8; frozen so later changes to the
+    live module can't change what this migration writes.
+    """
+    conn.execute("DELETE FROM update_counts")
+    conn.execute("DELETE FROM update_daily")
+    for dimension, (table, column) in dimensions.items():
+        conn.execute(f"""
+            INSERT INTO update_counts (dimension, value, count)
+            SELECT ?, {column}, COUNT(*) FROM {table}
+            WHERE {column} IS NOT NULL GROUP BY {column}
+        """, (dimension,))
+        conn.execute(f"""
+            INSERT INTO update_daily (dimension, day, value, count)
+            SELECT ?, substr(time, 1, 10), {column}, COUNT(*) FROM {table}
+            WHERE {column} IS NOT NULL GROUP BY substr(time, 1, 10), {column}
+        """, (dimension,))
+
+
+@migration(8, "Analytics rollups over updates, kept by triggers")
+def _update_rollups(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS update_counts (
+        dimension TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (dimension, value)
+    ) WITHOUT ROWID
+    """)
+    # Keyed by dimension then day so a date range is one range scan
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS update_daily (
+        dimension TEXT NOT NULL,
+        day TEXT NOT NULL,
+        value TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (dimension, day, value)
+    ) WITHOUT ROWID
+    """)
+
+    # Dimensions as of this version; machines were still counted by name
+    columns = {"info": "info", "vendor": "vendor", "machine": "machine"}
+    create_rollup_triggers(conn, "updates", columns)
+    _v8_rebuild(conn, {dimension: ("updates", column) for dimension, column in columns.items()})
+
+
+@migration(9, "Machine coordinates for restock route planning")
+def _machine_coordinates(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(machines)")}
+    for column in ("latitude", "longitude"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE machines ADD COLUMN {column} REAL")
+
+    # Carry the new columns into the change log
+    for op in ("insert", "update", "delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS machines_changes_{op}")
+    create_change_triggers(conn, "machines", CHANGE_LOG_TABLES["machines"][1] + ("latitude", "longitude"))
+
+
+# Update parsing as of migration 10, copied from update_parser so that later
+# changes to the live parser can't change what this migration backfills
+_V10_NAME_QTY = re.compile(r"([A-Za-z][A-Za-z0-9 '&.-]*?)\s*[x×*:]\s*(\d+)\b", re.IGNORECASE)
+_V10_QTY_NAME = re.compile(r"\b(\d+)\s*(?:[x×*]\s*)?([A-Za-z][A-Za-z0-9 '&.-]*)", re.IGNORECASE)
+_V10_LEADING_WORDS = re.compile(
+    r"^(?:(?:and|re-?stock(?:ed)?|refill(?:ed)?|added|add|loaded|load|filled|fill|put in)\s+)+",
+    re.IGNORECASE,
+)
+
+
+def _v10_snack_items(info, snack_ids):
+    """Matched (snack_id, quantity) pairs for an update's text."""
+    def clean(name):
+        return _V10_LEADING_WORDS.sub("", name.strip(" .-")).strip()
+
+    def match(name):
+        key = name.strip().lower()
+        for candidate in (key, key.removesuffix("s"), key + "s"):
+            if candidate in snack_ids:
+                return snack_ids[candidate]
+        prefixed = [snack_id for known, snack_id in snack_ids.items() if known.startswith(key + " ")]
+        return prefixed[0] if len(prefixed) == 1 else None
+
+    info = info or ""
+    items = [(clean(name), int(qty)) for name, qty in _V10_NAME_QTY.findall(info)]
+    if not items:
+        items = [(clean(name), int(qty)) for qty, name in _V10_QTY_NAME.findall(info)]
+    matched = []
+    for name, qty in items:
+        snack_id = match(name) if name else None
+        if snack_id is not None:
+            matched.append((snack_id, qty))
+    return matched
+
+
+def _v10_index_updates(conn, batch=1000):
+    """Fill updates.machine_id and update_items for the whole log."""
+    machine_ids = dict(conn.execute("SELECT name, id FROM machines"))
+    snack_ids = {}
+    for snack_id, name in conn.execute("SELECT id, name FROM snacks"):
+        snack_ids.setdefault(name.strip().lower(), snack_id)
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, machine, info, time, update_type FROM updates
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (last_id, batch)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        conn.executemany("UPDATE updates SET machine_id = ? WHERE id = ?",
+                         [(machine_ids.get(row[1]), row[0]) for row in rows])
+        conn.executemany("""
+            INSERT INTO update_items (update_id, machine_id, snack_id, quantity, update_type, time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (update_id, machine_ids.get(machine), snack_id, qty, update_type or "restock", time)
+            for update_id, machine, info, time, update_type in rows
+            for snack_id, qty in _v10_snack_items(info, snack_ids)
+        ])
+
+
+@migration(10, "Structured vendor updates: updates.machine_id and update_items")
+def _structured_updates(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(updates)")}
+    if "machine_id" not in columns:
+        conn.execute("ALTER TABLE updates ADD COLUMN machine_id INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_machine_id ON updates(machine_id, time)")
+    # New updates resolve machine_id from the machine's name
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_machines_name ON machines(name)")
+
+    # One row per snack mentioned in an update, with integer keys
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS update_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        update_id INTEGER NOT NULL,
+        machine_id INTEGER,
+        snack_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        update_type TEXT NOT NULL DEFAULT 'restock',
+        time TEXT NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_update_items_update ON update_items(update_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_update_items_slot ON update_items(machine_id, snack_id, time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_update_items_snack ON update_items(snack_id, time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_update_items_time ON update_items(time)")
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS updates_items_delete AFTER DELETE ON updates
+    BEGIN
+        DELETE FROM update_items WHERE update_id = OLD.id;
+    END
+    """)
+
+    # Parse the existing free-text log
+    _v10_index_updates(conn)
+
+    # Machines are now counted by id and snacks join the rollups. Info
+    # texts are no longer counted: nothing reads them and they are nearly
+    # as many as the updates themselves
+    create_rollup_triggers(conn, "updates", {"vendor": "vendor", "machine": "machine_id"})
+    create_rollup_triggers(conn, "update_items", {"snack": "snack_id"})
+    _v8_rebuild(conn, {
+        "vendor": ("updates", "vendor"),
+        "machine": ("updates", "machine_id"),
+        "snack": ("update_items", "snack_id"),
+    })
+
+
+@migration(11, "Index updates by type for the update history filters")
+def _updates_type_index(conn):
+    # view_updates pages on (time, id) under each filter: vendor, machine_id
+    # and plain time already have (column, time) indexes with id as rowid
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_updates_type_time ON updates(update_type, time)")
+
+
+@migration(12, "Full-text search index over update notes")
+def _updates_fts(conn):
+    # External content: the index stores only tokens and reads the text
+    # back from updates, so the notes aren't duplicated
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS updates_fts USING fts5(
+        info, content='updates', content_rowid='id', tokenize='porter unicode61'
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS updates_fts_insert AFTER INSERT ON updates
+    BEGIN
+        INSERT INTO updates_fts (rowid, info) VALUES (NEW.id, NEW.info);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS updates_fts_delete AFTER DELETE ON updates
+    BEGIN
+        INSERT INTO updates_fts (updates_fts, rowid, info) VALUES ('delete', OLD.id, OLD.info);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS updates_fts_update AFTER UPDATE OF info ON updates
+    BEGIN
+        INSERT INTO updates_fts (updates_fts, rowid, info) VALUES ('delete', OLD.id, OLD.info);
+        INSERT INTO updates_fts (rowid, info) VALUES (NEW.id, NEW.info);
+    END
+    """)
+    # Backfill the existing log
+    conn.execute("INSERT INTO updates_fts (updates_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO updates_fts (updates_fts) VALUES ('optimize')")
+
+
+@migration(13, "Stop counting update info texts in the rollups")
+def _drop_info_rollup(conn):
+    # For databases that ran migration 10 while it still counted info
+    create_rollup_triggers(conn, "updates", {"vendor": "vendor", "machine": "machine_id"})
+    conn.execute("DELETE FROM update_counts WHERE dimension = 'info'")
+    conn.execute("DELETE FROM update_daily WHERE dimension = 'info'")
+
+
+@migration(14, "Index machines by name")
+def _machines_name_index(conn):
+    # record_update() looks machine_id up by name on every vendor update;
+    # databases that ran migration 10 before it created this index lack it
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_machines_name ON machines(name)")
+
+
+# ---------- RUNNER ----------
+def _ensure_version_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    )
+    """)
+
+
+def applied_versions(conn):
+    _ensure_version_table(conn)
+    return {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+
+
+def migrate(path=DB, target=None):
+    """
+    Apply pending migrations up to `target` (default: latest).
+    Safe to call from several processes at once: each migration takes the
+    write lock and re-checks whether another process already applied it.
+    Returns the list of versions applied by this call.
+    """
+    conn = connect(path)
+    conn.isolation_level = None  # explicit BEGIN/COMMIT below
+    applied = []
+    try:
+        already = applied_versions(conn)
+        for version, description, fn in MIGRATIONS:
+            if target is not None and version > target:
+                break
+            if version in already:
+                continue
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                done = conn.execute(
+                    "SELECT 1 FROM schema_migrations WHERE version=?", (version,)
+                ).fetchone()
+                if done:
+                    conn.execute("COMMIT")
+                    continue
+
+                fn(conn)
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, datetime.now().isoformat(timespec="seconds"))
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                print(f"❌ Migration {version} failed: {description}")
+                raise
+
+            applied.append(version)
+            print(f"✅ Applied migration {version}: {description}")
+    finally:
+        conn.close()
+    return applied
+
+
+if __name__ == "__main__":
+    applied = migrate()
+    if not applied:
+        print("Database schema is up to date.")
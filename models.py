@@ -1,32 +1,250 @@
-from database import get_connection
+import json
+from datetime import datetime, timedelta
+
+from db_pool import get_pool, DB
+from expiry import cutoff_date, normalize_expiry_date
+from update_parser import index_updates
+
+pool = get_pool(DB)
+
+SNACK_FIELDS = ("id", "name", "stock", "expiry_date", "price", "category")
+LOW_STOCK_THRESHOLD = 10
+UPDATE_TYPES = ("restock", "maintenance", "issue")
 
 def add_snack(name, expiry_date, stock):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO snacks (name, expiry_date, stock) VALUES (?, ?, ?)",
-        (name, expiry_date, stock)
-    )
-    conn.commit()
-    conn.close()
+    with pool.connection() as conn:
+        conn.execute(
+            "INSERT INTO snacks (name, expiry_date, stock) VALUES (?, ?, ?)",
+            (name, normalize_expiry_date(expiry_date), stock)
+        )
+        conn.commit()
 
 
 def get_all_snacks():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM snacks")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
-
-
-def get_expiring_snacks():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT * FROM snacks
-        WHERE DATE(expiry_date) <= DATE('now', '+3 day');
-    """)
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    with pool.connection() as conn:
+        return conn.execute("SELECT * FROM snacks").fetchall()
+
+
+def get_expiring_snacks(days=3):
+    """
+    Snacks expiring within `days` (including already expired ones) as
+    (id, name, stock, expiry_date, days_left), soonest first.
+    Range scan on idx_snacks_expiry_date.
+    """
+    with pool.connection() as conn:
+        return conn.execute("""
+            SELECT id, name, stock, expiry_date,
+            (julianday(expiry_date) - julianday('now')) AS days_left
+            FROM snacks
+            WHERE expiry_date <= ?
+            ORDER BY expiry_date
+        """, (cutoff_date(days),)).fetchall()
+
+
+def get_inventory_stats(expiring_days=7, low_stock_threshold=LOW_STOCK_THRESHOLD):
+    """
+    All snack KPIs in a single pass over the table:
+    item count, total stock, low / out of stock counts and items expiring
+    within `expiring_days`.
+    """
+    with pool.connection() as conn:
+        row = conn.execute("""
+            SELECT COUNT(*),
+                   TOTAL(stock),
+                   TOTAL(stock < ?),
+                   TOTAL(stock = 0),
+                   TOTAL(expiry_date <= ?)
+            FROM snacks
+        """, (low_stock_threshold, cutoff_date(expiring_days))).fetchone()
+    return {
+        "total_items": row[0],
+        "total_stock": int(row[1]),
+        "low_stock": int(row[2]),
+        "out_of_stock": int(row[3]),
+        "expiring": int(row[4]),
+    }
+
+
+def get_snacks_page(fields=SNACK_FIELDS, after_id=0, limit=100, category=None,
+                    low_stock=False, expiring_days=None):
+    """
+    One keyset page of snacks ordered by id, as dicts with `fields`.
+    Fetches one extra row to tell whether another page follows; returns
+    (rows, next_after_id) where next_after_id is None on the last page.
+    """
+    columns = ["id"] + [f for f in fields if f != "id" and f in SNACK_FIELDS]
+    where, args = ["id > ?"], [after_id]
+    if category:
+        where.append("category = ?")
+        args.append(category)
+    if low_stock:
+        where.append("stock < ?")
+        args.append(LOW_STOCK_THRESHOLD)
+    if expiring_days is not None:
+        where.append("expiry_date <= ?")
+        args.append(cutoff_date(expiring_days))
+
+    with pool.connection() as conn:
+        rows = conn.execute(f"""
+            SELECT {", ".join(columns)} FROM snacks
+            WHERE {" AND ".join(where)}
+            ORDER BY id
+            LIMIT ?
+        """, (*args, limit + 1)).fetchall()
+
+    next_after_id = rows[limit - 1][0] if len(rows) > limit else None
+    rows = [dict(zip(columns, row)) for row in rows[:limit]]
+    if "id" not in fields:
+        for row in rows:
+            row.pop("id")
+    return rows, next_after_id
+
+
+def get_updates_page(limit=50, before=None, after=None, vendor=None, machine_id=None,
+                     update_type=None, start=None, end=None):
+    """
+    One keyset page of updates, newest first, ordered by (time, id).
+    `before` / `after` are (time, id) keys from a previous page: rows older
+    than `before`, or the page just newer than `after`. start and end are
+    dates (inclusive). Each filter has a (filter, time) index and id rides
+    along as the rowid, so every page is an index range scan.
+    Returns (rows, older, newer): the keys to page on from, or None at
+    either end of the log.
+    """
+    where, args = [], []
+    if vendor:
+        where.append("vendor = ?")
+        args.append(vendor)
+    if machine_id is not None:
+        where.append("machine_id = ?")
+        args.append(machine_id)
+    if update_type:
+        where.append("update_type = ?")
+        args.append(update_type)
+    if start:
+        where.append("time >= ?")
+        args.append(start.isoformat())
+    if end:
+        where.append("time < ?")
+        args.append((end + timedelta(days=1)).isoformat())
+
+    # Paging back towards newer rows walks the index upwards, then flips
+    backwards = after is not None and before is None
+    if backwards:
+        where.append("(time, id) > (?, ?)")
+        args.extend(after)
+    elif before is not None:
+        where.append("(time, id) < (?, ?)")
+        args.extend(before)
+    order = "ASC" if backwards else "DESC"
+
+    with pool.connection() as conn:
+        rows = conn.execute(f"""
+            SELECT id, vendor, machine, info, time, update_type FROM updates
+            WHERE {" AND ".join(where) or "1"}
+            ORDER BY time {order}, id {order}
+            LIMIT ?
+        """, (*args, limit + 1)).fetchall()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+    newest, oldest = (rows[0][4], rows[0][0]), (rows[-1][4], rows[-1][0])
+    if backwards:
+        return rows, oldest, newest if more else None
+    return rows, oldest if more else None, newest if before is not None else None
+
+
+def get_machine_inventory(machine_id, snack_ids=None):
+    """
+    This machine's slots as (snack_id, name, qty, expiry_date), by name.
+    Reads only the machine's own rows via the machine_inventory primary key;
+    pass `snack_ids` to read just those slots.
+    """
+    where, args = "mi.machine_id = ?", [machine_id]
+    if snack_ids is not None:
+        snack_ids = list(snack_ids)
+        if not snack_ids:
+            return []
+        where += f" AND mi.snack_id IN ({','.join('?' * len(snack_ids))})"
+        args += snack_ids
+    with pool.connection() as conn:
+        return conn.execute(f"""
+            SELECT s.id, s.name, mi.qty, s.expiry_date
+            FROM machine_inventory mi
+            JOIN snacks s ON s.id = mi.snack_id
+            WHERE {where}
+            ORDER BY s.name
+        """, args).fetchall()
+
+
+def record_update(vendor, machine, info, time, update_type="restock"):
+    """
+    Store a vendor update along with its parsed update_items and machine_id,
+    in one transaction. Returns the new update's id.
+    """
+    with pool.connection() as conn:
+        try:
+            update_id = conn.execute("""
+                INSERT INTO updates (vendor, machine, machine_id, info, time, update_type)
+                VALUES (?, ?, (SELECT id FROM machines WHERE name = ?), ?, ?, ?)
+            """, (vendor, machine, machine, info, time, update_type)).lastrowid
+            index_updates(conn, "id = ?", (update_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return update_id
+
+
+def unknown_snack_ids(conn, snack_ids):
+    """The ids in snack_ids that don't exist, checked in one query."""
+    return [row[0] for row in conn.execute("""
+        SELECT DISTINCT value FROM json_each(?)
+        WHERE value NOT IN (SELECT id FROM snacks)
+    """, (json.dumps(list(snack_ids)),))]
+
+
+def restock_machine(machine_id, items, mode="set"):
+    """
+    Apply many (snack_id, qty) slot updates to one machine in a single
+    transaction. mode="set" overwrites the quantity, mode="add" adjusts it
+    (negative qty removes stock, floored at zero).
+    Returns the number of slots written; raises ValueError, without writing
+    anything, if a snack id doesn't exist or a set quantity is negative.
+    """
+    if mode not in ("set", "add"):
+        raise ValueError(f"Unknown restock mode '{mode}'")
+
+    now = datetime.now().isoformat(timespec="seconds")
+    if mode == "set":
+        negative = sorted(snack_id for snack_id, qty in items if qty < 0)
+        if negative:
+            raise ValueError(f"Negative quantity for snack ids: {', '.join(map(str, negative))}")
+        new_qty, on_conflict = "?", "qty = excluded.qty"
+        rows = [(machine_id, snack_id, qty, now) for snack_id, qty in items]
+    else:
+        # The delta is bound again for the conflict branch: excluded.qty
+        # has already been floored at zero for the would-be new slot
+        new_qty, on_conflict = "MAX(?, 0)", "qty = MAX(machine_inventory.qty + ?, 0)"
+        rows = [(machine_id, snack_id, qty, now, qty) for snack_id, qty in items]
+
+    with pool.connection() as conn:
+        unknown = unknown_snack_ids(conn, {row[1] for row in rows})
+        if unknown:
+            raise ValueError(f"Unknown snack ids: {', '.join(map(str, sorted(unknown)))}")
+        try:
+            conn.executemany(f"""
+                INSERT INTO machine_inventory (machine_id, snack_id, qty, updated_at)
+                VALUES (?, ?, {new_qty}, ?)
+                ON CONFLICT(machine_id, snack_id) DO UPDATE SET
+                    {on_conflict}, updated_at = excluded.updated_at
+            """, rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(rows)
@@ -0,0 +1,207 @@
+"""
+Printable QR label sheets
+Lays machine QR codes out on paginated sheets (PDF or one PNG per page).
+Machines are read in batches and each page is rendered, written and
+discarded before the next, so memory stays flat for any fleet size.
+
+    python qr_sheets.py --out labels.pdf
+    python qr_sheets.py --out sheets/ --format png --columns 4 --rows 6
+"""
+
+import argparse
+import os
+import sys
+import zlib
+from itertools import islice
+
+from PIL import Image, ImageDraw, ImageFont
+
+from db_pool import get_pool
+from generate_qr import DB, machine_url, make_qr_image
+
+# Page sizes in PDF points (1/72 inch)
+PAGE_SIZES = {"a4": (595, 842), "letter": (612, 792)}
+
+
+class SheetLayout:
+    """Grid of labels on a page, rendered at `dpi`."""
+
+    def __init__(self, page="a4", columns=3, rows=4, dpi=300, margin_pt=24):
+        self.page_pt = PAGE_SIZES[page]
+        self.columns = columns
+        self.rows = rows
+        self.dpi = dpi
+        self.margin = self._px(margin_pt)
+        self.size = (self._px(self.page_pt[0]), self._px(self.page_pt[1]))
+        self.cell = (
+            (self.size[0] - 2 * self.margin) // columns,
+            (self.size[1] - 2 * self.margin) // rows,
+        )
+
+    @property
+    def per_page(self):
+        return self.columns * self.rows
+
+    def _px(self, points):
+        return int(round(points * self.dpi / 72))
+
+
+def iter_machines(conn, batch_size=500):
+    """Stream (id, name, location) rows without loading the whole table."""
+    cursor = conn.execute("SELECT id, name, location FROM machines ORDER BY id")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def _fit_text(draw, text, font, width):
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def render_page(machines, layout):
+    """One 1-bit page image with a label per machine."""
+    page = Image.new("1", layout.size, 1)
+    draw = ImageDraw.Draw(page)
+    cell_w, cell_h = layout.cell
+    title_font = ImageFont.load_default(size=max(12, cell_h // 14))
+    small_font = ImageFont.load_default(size=max(10, cell_h // 18))
+    text_h = title_font.size + small_font.size + cell_h // 20
+    qr_size = min(cell_w, cell_h - text_h) - cell_h // 10
+
+    for index, (machine_id, name, location) in enumerate(machines):
+        col, row = index % layout.columns, index // layout.columns
+        x0 = layout.margin + col * cell_w
+        y0 = layout.margin + row * cell_h
+
+        qr = make_qr_image(machine_url(machine_id)).get_image()
+        qr = qr.convert("1").resize((qr_size, qr_size), Image.NEAREST)
+        page.paste(qr, (x0 + (cell_w - qr_size) // 2, y0 + cell_h // 20))
+
+        text_y = y0 + cell_h // 20 + qr_size
+        label = _fit_text(draw, f"#{machine_id} {name}", title_font, cell_w * 0.92)
+        draw.text((x0 + cell_w // 2, text_y), label, font=title_font, fill=0, anchor="ma")
+        label = _fit_text(draw, location, small_font, cell_w * 0.92)
+        draw.text((x0 + cell_w // 2, text_y + title_font.size + 4), label, font=small_font, fill=0, anchor="ma")
+
+        # Cut guides
+        draw.rectangle([x0, y0, x0 + cell_w - 1, y0 + cell_h - 1], outline=0, width=1)
+
+    return page
+
+
+def iter_pages(machines, layout):
+    """Render pages lazily, one per `layout.per_page` machines."""
+    machines = iter(machines)
+    while True:
+        chunk = list(islice(machines, layout.per_page))
+        if not chunk:
+            return
+        yield render_page(chunk, layout)
+
+
+def iter_pdf(pages, layout):
+    """
+    Minimal streaming PDF writer: yields the file in pieces, one page at a
+    time. Pages are stored as Flate-compressed 1-bit images; the page tree
+    and xref table are written at the end once all offsets are known.
+    """
+    offsets = {}
+    position = 0
+    page_ids = []
+
+    def emit(chunk):
+        nonlocal position
+        position += len(chunk)
+        return chunk
+
+    def obj(number, body):
+        offsets[number] = position
+        if isinstance(body, str):
+            body = body.encode("latin-1")
+        return emit(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    yield emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    # 1 = catalog, 2 = page tree; page objects start at 3
+    next_id = 3
+    width_pt, height_pt = layout.page_pt
+    for page in pages:
+        image_id, content_id, page_id = next_id, next_id + 1, next_id + 2
+        next_id += 3
+
+        data = zlib.compress(page.tobytes())
+        yield obj(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode "
+            f"/Length {len(data)} >>\nstream\n"
+        ).encode() + data + b"\nendstream")
+
+        content = f"q {width_pt} 0 0 {height_pt} 0 0 cm /Im0 Do Q".encode()
+        yield obj(content_id, f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+
+        yield obj(page_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt} {height_pt}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ))
+        page_ids.append(page_id)
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    yield obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>")
+    yield obj(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+    xref_at = position
+    xref = [f"xref\n0 {next_id}\n", "0000000000 65535 f \n"]
+    for number in range(1, next_id):
+        xref.append(f"{offsets[number]:010d} 00000 n \n")
+    xref.append(f"trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n")
+    yield emit("".join(xref).encode())
+
+
+def write_pdf(pages, layout, out_path):
+    with open(out_path, "wb") as f:
+        for chunk in iter_pdf(pages, layout):
+            f.write(chunk)
+    return out_path
+
+
+def write_pngs(pages, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    for count, page in enumerate(pages, start=1):
+        page.save(os.path.join(out_dir, f"qr_sheet_{count:04d}.png"), optimize=True)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export printable QR label sheets")
+    parser.add_argument("--out", required=True, help="PDF file, or directory for PNG pages")
+    parser.add_argument("--format", choices=["pdf", "png"], default="pdf")
+    parser.add_argument("--page", choices=sorted(PAGE_SIZES), default="a4")
+    parser.add_argument("--columns", type=int, default=3)
+    parser.add_argument("--rows", type=int, default=4)
+    parser.add_argument("--dpi", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(DB):
+        print(f"❌ ERROR: Database '{DB}' not found!")
+        sys.exit(1)
+
+    layout = SheetLayout(args.page, args.columns, args.rows, args.dpi)
+    with get_pool(DB).connection() as conn:
+        pages = iter_pages(iter_machines(conn), layout)
+        if args.format == "pdf":
+            write_pdf(pages, layout, args.out)
+            print(f"✅ QR label sheets written to {args.out}")
+        else:
+            count = write_pngs(pages, args.out)
+            print(f"✅ {count} QR sheet page(s) written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Background render queue
+Runs slow jobs (chart rendering) on a worker thread instead of inside the
+request. Jobs are coalesced by key and debounced: a burst of submissions
+for the same key results in a single run once the burst settles.
+"""
+
+import threading
+import time
+import traceback
+from datetime import datetime
+
+
+class RenderQueue:
+    """
+    Single worker thread with a coalescing, debounced job table.
+
+    submit(key, fn) schedules fn to run `debounce` seconds after the last
+    submission for that key, but never later than `max_delay` seconds after
+    the first one, so a steady stream of submissions still renders.
+    """
+
+    def __init__(self, debounce=2.0, max_delay=10.0, name="render-worker"):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.name = name
+        self._pending = {}   # key -> {"fn", "first", "due"}
+        self._status = {}
+        self._running = None
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, key, fn):
+        """Queue fn under key, merging with any pending job for the same key."""
+        now = time.monotonic()
+        with self._cond:
+            status = self._status_for(key)
+            status["submitted"] += 1
+
+            job = self._pending.get(key)
+            if job:
+                status["coalesced"] += 1
+                job["fn"] = fn
+                job["due"] = min(now + self.debounce, job["first"] + self.max_delay)
+            else:
+                self._pending[key] = {"fn": fn, "first": now, "due": now + self.debounce}
+
+            if self._running != key:
+                status["state"] = "pending"
+            self._ensure_worker()
+            self._cond.notify()
+
+    def status(self, key):
+        """
+        Job status for key: state is 'idle', 'pending' or 'running'.
+        'pending' while running means another run is queued behind it.
+        """
+        with self._cond:
+            status = dict(self._status_for(key))
+            status["queued"] = key in self._pending
+            return status
+
+    def _status_for(self, key):
+        return self._status.setdefault(key, {
+            "state": "idle",
+            "submitted": 0,
+            "coalesced": 0,
+            "runs": 0,
+            "last_started": None,
+            "last_finished": None,
+            "last_error": None,
+        })
+
+    def _ensure_worker(self):
+        # Started lazily so the thread is created in the serving process,
+        # not in a parent that forks workers afterwards
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._work, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if self._pending:
+                    key, job = min(self._pending.items(), key=lambda item: item[1]["due"])
+                    delay = job["due"] - time.monotonic()
+                    if delay <= 0:
+                        del self._pending[key]
+                        self._running = key
+                        status = self._status_for(key)
+                        status["state"] = "running"
+                        status["last_started"] = datetime.now().isoformat(timespec="seconds")
+                        return key, job["fn"]
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+
+    def _work(self):
+        while True:
+            key, fn = self._next_job()
+            error = None
+            try:
+                fn()
+            except Exception as e:
+                error = str(e)
+                print(f"Render job '{key}' failed: {e}")
+                traceback.print_exc()
+
+            with self._cond:
+                self._running = None
+                status = self._status_for(key)
+                status["runs"] += 1
+                status["last_finished"] = datetime.now().isoformat(timespec="seconds")
+                status["last_error"] = error
+                status["state"] = "pending" if key in self._pending else "idle"
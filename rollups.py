@@ -0,0 +1,180 @@
+"""
+Analytics rollups for vendor updates
+update_counts holds all-time counts per vendor / machine / snack and
+update_daily the same counts per day. Both are kept current by
+triggers on updates and update_items (see migrations 8, 10 and 13), so
+analytics reads a few hundred rollup rows instead of grouping the whole
+log. Machines and snacks are counted by id and shown by their current
+name. trends() buckets counts by hour, day or week for a date range.
+rebuild() recomputes the rollups from scratch.
+
+Usage:
+    python rollups.py          # rebuild all rollups
+"""
+
+import os
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from db_pool import get_pool, DB
+
+# dimension -> (table, column) it counts
+DIMENSIONS = {
+    "vendor": ("updates", "vendor"),
+    "machine": ("updates", "machine_id"),
+    "snack": ("update_items", "snack_id"),
+}
+# Dimensions whose values are ids, and the table holding their names
+NAMED_DIMENSIONS = {"machine": "machines", "snack": "snacks"}
+BUCKETS = ("hour", "day", "week")
+# Hourly trends group the raw log over a time-index range scan, so keep
+# the window bounded; day and week read update_daily and can span more
+MAX_HOURLY_DAYS = 31
+
+
+def rebuild(conn, dimensions=None):
+    """
+    Recompute both rollup tables from updates and update_items.
+    Runs in the caller's transaction; the caller commits.
+    """
+    conn.execute("DELETE FROM update_counts")
+    conn.execute("DELETE FROM update_daily")
+    for dimension, (table, column) in (dimensions or DIMENSIONS).items():
+        conn.execute(f"""
+            INSERT INTO update_counts (dimension, value, count)
+            SELECT ?, {column}, COUNT(*) FROM {table}
+            WHERE {column} IS NOT NULL GROUP BY {column}
+        """, (dimension,))
+        conn.execute(f"""
+            INSERT INTO update_daily (dimension, day, value, count)
+            SELECT ?, substr(time, 1, 10), {column}, COUNT(*) FROM {table}
+            WHERE {column} IS NOT NULL GROUP BY substr(time, 1, 10), {column}
+        """, (dimension,))
+
+
+def names_for(conn, dimension):
+    """{value: display name} for id dimensions; empty for the others."""
+    table = NAMED_DIMENSIONS.get(dimension)
+    if table is None:
+        return {}
+    return {str(row[0]): row[1] for row in conn.execute(f"SELECT id, name FROM {table}")}
+
+
+def top_counts(conn, dimension, limit=None):
+    """
+    (value, count) rows for one dimension, most frequent first. Machines
+    and snacks are returned by name; ones deleted since keep their id.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}'")
+    table = NAMED_DIMENSIONS.get(dimension)
+    label = f"COALESCE((SELECT name FROM {table} WHERE id = uc.value), uc.value)" if table else "uc.value"
+    return conn.execute(f"""
+        SELECT {label}, uc.count FROM update_counts uc
+        WHERE uc.dimension = ?
+        ORDER BY uc.count DESC, uc.value
+        LIMIT ?
+    """, (dimension, -1 if limit is None else limit)).fetchall()
+
+
+def _bucket_starts(bucket, start, end):
+    """Every bucket label from start to end (dates, inclusive)."""
+    if bucket == "hour":
+        moment = datetime.combine(start, datetime.min.time())
+        stop = datetime.combine(end, datetime.max.time())
+        while moment <= stop:
+            yield moment.strftime("%Y-%m-%dT%H")
+            moment += timedelta(hours=1)
+        return
+    step = timedelta(days=7 if bucket == "week" else 1)
+    day = start - timedelta(days=start.weekday()) if bucket == "week" else start
+    while day <= end:
+        yield day.isoformat()
+        day += step
+
+
+def trends(conn, bucket, start, end, dimension, top=5):
+    """
+    Update counts per `bucket` between the dates start and end (inclusive),
+    one series per `dimension` value. The `top` busiest values get their own
+    series and the rest are summed into "Other". Weeks start on Monday.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"dimension must be one of {', '.join(DIMENSIONS)}")
+    if start > end:
+        raise ValueError("start must not be after end")
+    if bucket == "hour" and (end - start).days >= MAX_HOURLY_DAYS:
+        raise ValueError(f"hourly trends are limited to {MAX_HOURLY_DAYS} days")
+
+    if bucket == "hour":
+        table, column = DIMENSIONS[dimension]
+        rows = conn.execute(f"""
+            SELECT substr(time, 1, 13), CAST({column} AS TEXT), COUNT(*)
+            FROM {table}
+            WHERE time >= ? AND time < ? AND {column} IS NOT NULL
+            GROUP BY 1, 2
+        """, (start.isoformat(), (end + timedelta(days=1)).isoformat())).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT day, value, count FROM update_daily
+            WHERE dimension = ? AND day BETWEEN ? AND ?
+        """, (dimension, start.isoformat(), end.isoformat())).fetchall()
+        if bucket == "week":
+            rows = [(_week_of(day), value, count) for day, value, count in rows]
+
+    labels = list(_bucket_starts(bucket, start, end))
+    index = {label: i for i, label in enumerate(labels)}
+    names = names_for(conn, dimension)
+    counts = defaultdict(lambda: [0] * len(labels))
+    for label, value, count in rows:
+        if label in index:
+            counts[names.get(value, value)][index[label]] += count
+
+    ranked = sorted(counts.items(), key=lambda item: (-sum(item[1]), item[0]))
+    series = [{"name": value, "counts": values, "total": sum(values)} for value, values in ranked[:top]]
+    if len(ranked) > top:
+        other = [sum(column) for column in zip(*(values for _, values in ranked[top:]))]
+        series.append({"name": "Other", "counts": other, "total": sum(other)})
+
+    return {
+        "bucket": bucket,
+        "dimension": dimension,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "buckets": labels,
+        "series": series,
+        "totals": [sum(column) for column in zip(*(s["counts"] for s in series))] or [0] * len(labels),
+    }
+
+
+def _week_of(day):
+    d = date.fromisoformat(day)
+    return (d - timedelta(days=d.weekday())).isoformat()
+
+
+def main():
+    if not os.path.exists(DB):
+        print(f"❌ ERROR: Database '{DB}' not found!")
+        sys.exit(1)
+
+    with get_pool(DB).connection() as conn:
+        try:
+            rebuild(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        counts = dict(conn.execute("SELECT dimension, COUNT(*) FROM update_counts GROUP BY dimension"))
+        days = conn.execute("SELECT COUNT(DISTINCT day) FROM update_daily").fetchone()[0]
+
+    print("✅ Analytics rollups rebuilt")
+    for dimension in DIMENSIONS:
+        print(f"   {dimension}: {counts.get(dimension, 0)} distinct value(s)")
+    print(f"   {days} day(s) of daily buckets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Restock route planner
+Orders the machines that need a visit (low or expiring stock) into a short
+route: nearest-neighbour to get a tour, then 2-opt to remove crossings.
+Distances are great-circle kilometres between machine coordinates; the
+matrix for a set of stops is computed once with NumPy and cached, and so
+is the finished route for a given set of stops.
+
+Usage:
+    python route_planner.py [--start LAT,LNG] [--limit 25]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+
+from db_pool import get_pool, DB
+from expiry import cutoff_date
+from lru import LRUCache
+from models import LOW_STOCK_THRESHOLD
+
+EARTH_RADIUS_KM = 6371.0
+EXPIRING_DAYS = 3
+MAX_2OPT_PASSES = 50
+# A vendor's route covers this many of the most urgent machines
+ROUTE_MAX_STOPS = 25
+
+_matrices = LRUCache(max_entries=32)
+_routes = LRUCache(max_entries=32)
+
+
+def parse_point(value):
+    """'lat,lng' -> (lat, lng) floats; raises ValueError on bad input."""
+    try:
+        lat, lng = (float(part) for part in str(value).split(","))
+    except (TypeError, ValueError):
+        raise ValueError(f"Expected 'lat,lng', got {value!r}")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError(f"Coordinates out of range: {value!r}")
+    return lat, lng
+
+
+def stops_needing_restock(conn, low_stock=LOW_STOCK_THRESHOLD, expiring_days=EXPIRING_DAYS, limit=None):
+    """
+    Active machines with at least one low or expiring slot, most urgent
+    (most such slots) first, as dicts with id, name, location, lat, lng and
+    the count of low / expiring slots. `limit` keeps only the top N.
+    """
+    cutoff = cutoff_date(expiring_days)
+    rows = conn.execute("""
+        SELECT m.id, m.name, m.location, m.latitude, m.longitude,
+               TOTAL(mi.qty < ?) AS low, TOTAL(mi.qty > 0 AND s.expiry_date <= ?) AS expiring
+        FROM machines m
+        JOIN machine_inventory mi ON mi.machine_id = m.id
+        JOIN snacks s ON s.id = mi.snack_id
+        WHERE m.status = 'active'
+        GROUP BY m.id
+        HAVING low > 0 OR expiring > 0
+        ORDER BY low + expiring DESC, m.id
+        LIMIT ?
+    """, (low_stock, cutoff, -1 if limit is None else limit)).fetchall()
+    return [{
+        "id": row[0],
+        "name": row[1],
+        "location": row[2],
+        "lat": row[3],
+        "lng": row[4],
+        "low": int(row[5]),
+        "expiring": int(row[6]),
+    } for row in rows]
+
+
+def haversine_matrix(points):
+    """Pairwise great-circle distances (km) for an (n, 2) array of lat/lng."""
+    lat, lng = np.radians(points[:, 0]), np.radians(points[:, 1])
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix(points):
+    """haversine_matrix(), cached by the exact set of coordinates."""
+    key = hashlib.sha256(np.ascontiguousarray(points, dtype=np.float64).tobytes()).hexdigest()
+    matrix = _matrices.get(key)
+    if matrix is None:
+        matrix = haversine_matrix(points)
+        _matrices.put(key, matrix)
+    return matrix
+
+
+def nearest_neighbour(dist, start=0):
+    """Greedy open tour from `start`, always moving to the closest unvisited stop."""
+    n = len(dist)
+    tour = [start]
+    visited = np.zeros(n, dtype=bool)
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[tour[-1]])
+        nxt = int(np.argmin(row))
+        tour.append(nxt)
+        visited[nxt] = True
+    return np.array(tour)
+
+
+def two_opt(dist, tour, max_passes=MAX_2OPT_PASSES):
+    """
+    Improve an open tour (first stop fixed) by reversing segments while that
+    shortens it. For each segment start, every segment end is scored at once.
+    """
+    tour = tour.copy()
+    n = len(tour)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = tour[i - 1], tour[i]
+            ends = np.arange(i + 1, n)
+            c = tour[ends]
+            # Reversing tour[i..j] swaps edges (a,b),(c,d) for (a,c),(b,d);
+            # at the end of the path there is no d
+            has_next = ends < n - 1
+            d = tour[np.minimum(ends + 1, n - 1)]
+            delta = dist[a, c] - dist[a, b] + np.where(has_next, dist[b, d] - dist[c, d], 0.0)
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                j = ends[best]
+                tour[i:j + 1] = tour[i:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return tour
+
+
+def plan_route(stops, start=None):
+    """
+    Order stops into a route. Starts at `start` (lat, lng) if given, else at
+    the most urgent stop. Stops without coordinates can't be placed and are
+    returned separately. Returns a dict with the ordered stops (each with
+    leg and cumulative km), total_km, unplaced and elapsed_ms.
+    """
+    started = time.perf_counter()
+    placed = [s for s in stops if s["lat"] is not None and s["lng"] is not None]
+    unplaced = [s for s in stops if s["lat"] is None or s["lng"] is None]
+
+    route, total = [], 0.0
+    if placed:
+        if start is None:
+            placed.sort(key=lambda s: (-(s["low"] + s["expiring"]), s["id"]))
+        points = np.array([(s["lat"], s["lng"]) for s in placed], dtype=np.float64)
+        if start is not None:
+            points = np.vstack(([start], points))
+        dist = distance_matrix(points)
+
+        tour = two_opt(dist, nearest_neighbour(dist))
+        offset = 1 if start is not None else 0
+        previous = tour[0]
+        for index in tour[offset:]:
+            leg = float(dist[previous, index])
+            total += leg
+            stop = dict(placed[index - offset], leg_km=round(leg, 2), cumulative_km=round(total, 2))
+            route.append(stop)
+            previous = index
+
+    return {
+        "start": list(start) if start is not None else None,
+        "stops": route,
+        "total_km": round(total, 2),
+        "unplaced": unplaced,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def cached_route(stops, start=None):
+    """
+    plan_route(), cached by the stops (with their counts) and start point,
+    so repeated requests replan only once the restock set changes.
+    """
+    key = hashlib.sha256(repr((
+        start, [(s["id"], s["name"], s["location"], s["lat"], s["lng"], s["low"], s["expiring"]) for s in stops]
+    )).encode()).hexdigest()
+    route = _routes.get(key)
+    if route is None:
+        route = plan_route(stops, start)
+        _routes.put(key, route)
+    return route
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan a restock route over machines that need a visit")
+    parser.add_argument("--start", help="Starting point as LAT,LNG")
+    parser.add_argument("--limit", type=int, default=ROUTE_MAX_STOPS, help="Most urgent machines to visit")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(DB):
+        print(f"❌ ERROR: Database '{DB}' not found!")
+        sys.exit(1)
+
+    try:
+        start = parse_point(args.start) if args.start else None
+    except ValueError as e:
+        print(f"❌ ERROR: {e}")
+        sys.exit(1)
+
+    with get_pool(DB).connection() as conn:
+        route = plan_route(stops_needing_restock(conn, limit=args.limit), start)
+
+    if not route["stops"] and not route["unplaced"]:
+        print("✅ No machines need restocking right now.")
+        return
+    print(f"🚚 Restock route: {len(route['stops'])} stop(s), {route['total_km']} km ({route['elapsed_ms']} ms)")
+    for number, stop in enumerate(route["stops"], start=1):
+        print(f"   {number:>3}. {stop['name']:<28} {stop['location']:<36} "
+              f"+{stop['leg_km']:.2f} km  (low {stop['low']}, expiring {stop['expiring']})")
+    if route["unplaced"]:
+        print(f"⚠️  {len(route['unplaced'])} machine(s) have no coordinates and were left out:")
+        for stop in route["unplaced"]:
+            print(f"   - {stop['name']} ({stop['location']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -76,6 +76,7 @@ def initialize_database():
     
     try:
         import database
+        database.init_db()
         print("✅ Database initialized successfully!")
         return True
     except Exception as e:
@@ -88,6 +89,7 @@ def generate_qr_codes():
     
     try:
         import generate_qr
+        generate_qr.generate_missing_qr()
         print("✅ QR codes generated successfully!")
         return True
     except Exception as e:
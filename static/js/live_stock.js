@@ -0,0 +1,58 @@
+// Live stock for machine pages: the server pushes changed rows over SSE
+// and the table is patched in place instead of reloading the page
+(function () {
+    const table = document.getElementById("liveStock");
+    if (!table) return;
+
+    if (!window.EventSource) {
+        setInterval(() => window.location.reload(), 30000);
+        return;
+    }
+
+    function statusBadge(stock) {
+        if (stock > 20) return '<span class="badge bg-success">Available</span>';
+        if (stock > 0) return '<span class="badge bg-warning">Low</span>';
+        return '<span class="badge bg-danger">Out</span>';
+    }
+
+    function upsertRow(snack) {
+        let row = table.querySelector(`tr[data-snack-id="${snack.id}"]`);
+        if (!row) {
+            row = document.createElement("tr");
+            row.dataset.snackId = snack.id;
+            row.innerHTML = '<td class="snack-name"></td><td class="snack-stock"></td>' +
+                            '<td class="snack-expiry"></td><td class="snack-status"></td>';
+            const next = Array.from(table.rows).find(
+                r => r.querySelector(".snack-name").textContent.localeCompare(snack.name) > 0
+            );
+            table.insertBefore(row, next || null);
+        }
+        row.querySelector(".snack-name").textContent = snack.name;
+        row.querySelector(".snack-expiry").textContent = snack.expiry_date;
+        const stockCell = row.querySelector(".snack-stock");
+        if (stockCell.textContent !== String(snack.stock)) {
+            stockCell.textContent = snack.stock;
+            row.querySelector(".snack-status").innerHTML = statusBadge(snack.stock);
+        }
+    }
+
+    const source = new EventSource(table.dataset.streamUrl);
+
+    source.addEventListener("snapshot", e => {
+        const snacks = JSON.parse(e.data);
+        const ids = new Set(snacks.map(s => String(s.id)));
+        Array.from(table.rows).forEach(r => {
+            if (!ids.has(r.dataset.snackId)) r.remove();
+        });
+        snacks.forEach(upsertRow);
+    });
+
+    source.addEventListener("stock", e => {
+        const delta = JSON.parse(e.data);
+        delta.changed.forEach(upsertRow);
+        delta.removed.forEach(id => {
+            const row = table.querySelector(`tr[data-snack-id="${id}"]`);
+            if (row) row.remove();
+        });
+    });
+})();
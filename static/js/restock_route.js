@@ -0,0 +1,57 @@
+// Suggested restock route on the vendor page: planned by /api/restock_route
+// after the page has rendered, so a slow plan never holds up the form
+(function () {
+    const card = document.getElementById("restockRoute");
+    if (!card) return;
+
+    const km = document.getElementById("restockRouteKm");
+    const list = document.getElementById("restockRouteStops");
+    const unplaced = document.getElementById("restockRouteUnplaced");
+
+    function badge(className, text) {
+        const span = document.createElement("span");
+        span.className = "badge me-1 " + className;
+        span.textContent = text;
+        return span;
+    }
+
+    function stopItem(stop) {
+        const item = document.createElement("li");
+        item.className = "list-group-item d-flex justify-content-between align-items-start";
+        const label = document.createElement("div");
+        label.className = "ms-2 me-auto";
+        const name = document.createElement("div");
+        name.className = "fw-bold";
+        name.textContent = stop.name;
+        const location = document.createElement("small");
+        location.className = "text-muted";
+        location.textContent = stop.location;
+        label.append(name, location);
+        item.append(label);
+        if (stop.low) item.append(badge("bg-warning", stop.low + " low"));
+        if (stop.expiring) item.append(badge("bg-danger", stop.expiring + " expiring"));
+        const leg = document.createElement("small");
+        leg.className = "text-muted";
+        leg.textContent = "+" + stop.leg_km + " km";
+        item.append(leg);
+        return item;
+    }
+
+    fetch(card.dataset.url, { headers: { "Accept": "application/json" } })
+        .then(response => response.ok ? response.json() : Promise.reject(response.status))
+        .then(route => {
+            if (!route.stops.length && !route.unplaced.length) return;
+            if (route.stops.length) {
+                km.textContent = route.total_km + " km";
+                km.classList.remove("d-none");
+                list.replaceChildren(...route.stops.map(stopItem));
+                list.classList.remove("d-none");
+            }
+            if (route.unplaced.length) {
+                unplaced.querySelector("span").textContent = route.unplaced.map(s => s.name).join(", ");
+                unplaced.classList.remove("d-none");
+            }
+            card.classList.remove("d-none");
+        })
+        .catch(() => {});
+})();
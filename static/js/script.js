@@ -23,13 +23,6 @@ document.querySelectorAll("button, .btn").forEach(btn => {
     });
 });
 
-// Auto-refresh for machine live-stock pages
-if (window.location.pathname.includes("machine_view")) {
-    setInterval(() => {
-        window.location.reload();
-    }, 5000);
-}
-
 // Auto-refresh QR page
 if (window.location.pathname.includes("qr_access")) {
     setInterval(() => {
@@ -0,0 +1,76 @@
+// Activity trends on the analytics page: bucketed counts come from
+// /api/analytics/trends and are drawn client-side as a stacked bar chart
+(function () {
+    const form = document.getElementById("trendsForm");
+    const canvas = document.getElementById("trendsChart");
+    if (!form || !canvas || !window.Chart) return;
+
+    const error = document.getElementById("trendsError");
+    const colors = ["#667eea", "#28a745", "#17a2b8", "#ffc107", "#dc3545", "#6f42c1", "#adb5bd"];
+    let chart = null;
+
+    function isoDate(d) {
+        return d.toISOString().slice(0, 10);
+    }
+
+    function label(bucket, value) {
+        if (bucket === "hour") return value.replace("T", " ") + ":00";
+        if (bucket === "week") return "Week of " + value;
+        return value;
+    }
+
+    function draw(data) {
+        const datasets = data.series.map((s, i) => ({
+            label: s.name,
+            data: s.counts,
+            backgroundColor: s.name === "Other" ? colors[colors.length - 1] : colors[i % (colors.length - 1)],
+        }));
+        const labels = data.buckets.map(b => label(data.bucket, b));
+
+        if (chart) {
+            chart.data.labels = labels;
+            chart.data.datasets = datasets;
+            chart.update();
+            return;
+        }
+        chart = new Chart(canvas, {
+            type: "bar",
+            data: { labels, datasets },
+            options: {
+                responsive: true,
+                scales: {
+                    x: { stacked: true },
+                    y: { stacked: true, beginAtZero: true, ticks: { precision: 0 } },
+                },
+                plugins: { legend: { position: "bottom" } },
+            },
+        });
+    }
+
+    function load() {
+        const params = new URLSearchParams(new FormData(form));
+        fetch(form.dataset.url + "?" + params)
+            .then(r => r.json().then(body => ({ ok: r.ok, body })))
+            .then(({ ok, body }) => {
+                if (!ok) {
+                    error.textContent = body.error || "Could not load trends";
+                    error.style.display = "";
+                    return;
+                }
+                error.style.display = "none";
+                draw(body);
+            });
+    }
+
+    // Default to the last 30 days
+    const end = new Date();
+    const start = new Date(end.getTime() - 29 * 24 * 3600 * 1000);
+    form.elements.end.value = isoDate(end);
+    form.elements.start.value = isoDate(start);
+
+    form.addEventListener("submit", e => {
+        e.preventDefault();
+        load();
+    });
+    load();
+})();
@@ -0,0 +1,152 @@
+"""
+Vendor update parser
+Pulls (snack, quantity) items out of free-text vendor updates such as
+"Restocked Chips x50, Chocolate x30" and matches them to the catalog.
+index_updates() stores the result as integer-keyed update_items rows.
+"""
+
+import re
+import threading
+from functools import lru_cache
+
+# "<name> x50", "<name> x 50", "<name> ×50", "<name>*50", "<name>: 50"
+NAME_QTY = re.compile(r"([A-Za-z][A-Za-z0-9 '&.-]*?)\s*[x×*:]\s*(\d+)\b", re.IGNORECASE)
+# "50 <name>", "50 x <name>"; only tried when the text has no NAME_QTY items
+QTY_NAME = re.compile(r"\b(\d+)\s*(?:[x×*]\s*)?([A-Za-z][A-Za-z0-9 '&.-]*)", re.IGNORECASE)
+LEADING_WORDS = re.compile(
+    r"^(?:(?:and|re-?stock(?:ed)?|refill(?:ed)?|added|add|loaded|load|filled|fill|put in)\s+)+",
+    re.IGNORECASE,
+)
+
+
+def _clean_name(name):
+    return LEADING_WORDS.sub("", name.strip(" .-")).strip()
+
+
+@lru_cache(maxsize=4096)
+def parse_items(info):
+    """
+    (name, quantity) pairs mentioned in an update, in order. Names are as
+    written, minus verbs like "Restocked"; text without quantities yields ().
+    Cached, since the same update text repeats a lot across the log.
+    """
+    info = info or ""
+    items = [(_clean_name(name), int(qty)) for name, qty in NAME_QTY.findall(info)]
+    if not items:
+        items = [(_clean_name(name), int(qty)) for qty, name in QTY_NAME.findall(info)]
+    return tuple((name, qty) for name, qty in items if name)
+
+
+class SnackMatcher:
+    """
+    Resolve written names to snack ids: exact (case-insensitive) first,
+    then a unique catalog name starting with the written one ("Chocolate"
+    -> "Chocolate Bar"), then singular/plural variants.
+    """
+
+    def __init__(self, snacks):
+        self.by_name = {}
+        for snack_id, name in snacks:
+            self.by_name.setdefault(name.strip().lower(), snack_id)
+        self._cache = {}
+
+    @classmethod
+    def from_db(cls, conn):
+        return cls(conn.execute("SELECT id, name FROM snacks").fetchall())
+
+    def match(self, name):
+        """Snack id for a written name, or None if it's unknown or ambiguous."""
+        key = name.strip().lower()
+        if key not in self._cache:
+            self._cache[key] = self._lookup(key)
+        return self._cache[key]
+
+    def _lookup(self, key):
+        # removesuffix, not rstrip: "glass" must not become "gla"
+        for candidate in (key, key.removesuffix("s"), key + "s"):
+            if candidate in self.by_name:
+                return self.by_name[candidate]
+        prefixed = [snack_id for name, snack_id in self.by_name.items() if name.startswith(key + " ")]
+        return prefixed[0] if len(prefixed) == 1 else None
+
+    def items(self, info):
+        """Matched (snack_id, quantity) pairs for an update's text."""
+        matched = []
+        for name, qty in parse_items(info):
+            snack_id = self.match(name)
+            if snack_id is not None:
+                matched.append((snack_id, qty))
+        return matched
+
+
+INDEX_BATCH = 1000
+
+_catalog = {"key": None, "machine_ids": None, "matcher": None}
+_catalog_lock = threading.Lock()
+
+
+def _catalog_key(conn):
+    """
+    Moves on with any snack or machine write: the change log records those,
+    and the max ids catch rows inserted with the triggers off (generate_data).
+    """
+    return conn.execute("""
+        SELECT (SELECT file FROM pragma_database_list WHERE name = 'main'),
+               (SELECT MAX(version) FROM changes),
+               (SELECT MAX(id) FROM snacks),
+               (SELECT MAX(id) FROM machines)
+    """).fetchone()
+
+
+def catalog(conn):
+    """
+    (machine name -> id map, SnackMatcher) for the current catalog, cached
+    until a snack or machine changes so single-update indexing stays cheap.
+    """
+    key = _catalog_key(conn)
+    with _catalog_lock:
+        if _catalog["key"] == key:
+            return _catalog["machine_ids"], _catalog["matcher"]
+    machine_ids = dict(conn.execute("SELECT name, id FROM machines"))
+    matcher = SnackMatcher.from_db(conn)
+    with _catalog_lock:
+        _catalog.update(key=key, machine_ids=machine_ids, matcher=matcher)
+    return machine_ids, matcher
+
+
+def index_updates(conn, where="1", args=()):
+    """
+    (Re)build update_items and updates.machine_id for the updates matching
+    `where`, in id-ordered batches. Runs in the caller's transaction; the
+    caller commits. Returns the number of items written.
+    """
+    machine_ids, matcher = catalog(conn)
+    written, last_id = 0, 0
+    while True:
+        rows = conn.execute(f"""
+            SELECT id, machine, machine_id, info, time, update_type FROM updates
+            WHERE ({where}) AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (*args, last_id, INDEX_BATCH)).fetchall()
+        if not rows:
+            return written
+        last_id = rows[-1][0]
+
+        relinked, items = [], []
+        for update_id, machine, machine_id, info, time, update_type in rows:
+            resolved = machine_ids.get(machine, machine_id)
+            if resolved != machine_id:
+                relinked.append((resolved, update_id))
+            items.extend(
+                (update_id, resolved, snack_id, qty, update_type or "restock", time)
+                for snack_id, qty in matcher.items(info)
+            )
+
+        conn.executemany("UPDATE updates SET machine_id = ? WHERE id = ?", relinked)
+        conn.executemany("DELETE FROM update_items WHERE update_id = ?", [(row[0],) for row in rows])
+        conn.executemany("""
+            INSERT INTO update_items (update_id, machine_id, snack_id, quantity, update_type, time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, items)
+        written += len(items)
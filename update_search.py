@@ -0,0 +1,137 @@
+"""
+Full-text search over vendor update notes
+updates_fts is an external-content FTS5 index over updates.info, kept in
+sync by triggers (see migration 12). Results are ranked with bm25 and
+come with a highlighted snippet of the matching text.
+
+Usage:
+    python update_search.py "jammed coin slot"   # search from the shell
+    python update_search.py --rebuild            # rebuild the index
+"""
+
+import argparse
+import html
+import os
+import re
+import sys
+import time
+
+from markupsafe import escape
+
+from db_pool import get_pool, DB
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+SNIPPET_TOKENS = 16
+# Private-use markers around matches; swapped for <mark> after escaping
+_OPEN, _CLOSE = "\ue000", "\ue001"
+TERMS = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def match_query(text):
+    """
+    Turn what an admin typed into an FTS5 MATCH expression. Words must all
+    appear (in any order), "quoted text" must appear as a phrase and the
+    last bare word also matches as a prefix, so "choc" finds Chocolate.
+    FTS5 operators and punctuation are treated as plain text.
+    Returns None if there is nothing to search for.
+    """
+    terms = []
+    for phrase, word in TERMS.findall(text or ""):
+        value = (phrase or word).replace('"', "").strip()
+        if value:
+            terms.append((value, bool(word)))
+    if not terms:
+        return None
+    parts = [f'"{value}"' for value, _ in terms]
+    if terms[-1][1]:
+        parts[-1] += "*"
+    return " ".join(parts)
+
+
+def highlight(snippet):
+    """HTML-escaped snippet with matches wrapped in <mark>."""
+    return str(escape(snippet)).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def search(conn, text, limit=SEARCH_LIMIT):
+    """
+    Best-matching updates for `text`, best first, as dicts with id, vendor,
+    machine, time, update_type, rank and an HTML snippet.
+    Raises ValueError for an empty query.
+    """
+    query = match_query(text)
+    if query is None:
+        raise ValueError("Enter something to search for")
+    rows = conn.execute("""
+        SELECT u.id, u.vendor, u.machine, u.time, u.update_type,
+               snippet(updates_fts, 0, ?, ?, '…', ?), updates_fts.rank
+        FROM updates_fts
+        JOIN updates u ON u.id = updates_fts.rowid
+        WHERE updates_fts MATCH ?
+        ORDER BY updates_fts.rank
+        LIMIT ?
+    """, (_OPEN, _CLOSE, SNIPPET_TOKENS, query, limit)).fetchall()
+    return [{
+        "id": row[0],
+        "vendor": row[1],
+        "machine": row[2],
+        "time": row[3],
+        "update_type": row[4] or "restock",
+        "snippet": highlight(row[5]),
+        "rank": round(row[6], 4),
+    } for row in rows]
+
+
+def rebuild(conn):
+    """
+    Re-index every update from scratch; use after bulk changes made with
+    the triggers off. Runs in the caller's transaction; the caller commits.
+    """
+    conn.execute("INSERT INTO updates_fts (updates_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO updates_fts (updates_fts) VALUES ('optimize')")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search vendor update notes")
+    parser.add_argument("query", nargs="?", help="Words or \"a phrase\" to look for")
+    parser.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the search index first")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(DB):
+        print(f"❌ ERROR: Database '{DB}' not found!")
+        sys.exit(1)
+    if not args.query and not args.rebuild:
+        parser.error("give a query or --rebuild")
+
+    with get_pool(DB).connection() as conn:
+        if args.rebuild:
+            started = time.perf_counter()
+            try:
+                rebuild(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            indexed = conn.execute("SELECT COUNT(*) FROM updates").fetchone()[0]
+            print(f"✅ Search index rebuilt: {indexed} update(s) in {time.perf_counter() - started:.2f}s")
+        if not args.query:
+            return
+
+        started = time.perf_counter()
+        try:
+            results = search(conn, args.query, args.limit)
+        except ValueError as e:
+            print(f"❌ ERROR: {e}")
+            sys.exit(1)
+        elapsed = (time.perf_counter() - started) * 1000
+
+    print(f"🔍 {len(results)} match(es) for {args.query!r} ({elapsed:.1f} ms)")
+    for result in results:
+        text = html.unescape(result["snippet"].replace("<mark>", "[").replace("</mark>", "]"))
+        print(f"   #{result['id']:<7} {result['time']:<20} {result['vendor']:<12} {result['machine']:<28} {text}")
+
+
+if __name__ == "__main__":
+    main()